@@ -1,13 +1,12 @@
 import os
 import re
-import time
-import requests
-import threading
-from queue import Queue
+import speed_engine
+import result_store
+import classify
+import scan_engine
 from threading import Thread
 from datetime import datetime
 from datetime import timedelta
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
 def should_run():
@@ -39,38 +38,25 @@ def update_run_time():
         file.write(current_time.strftime('%Y-%m-%d %H:%M:%S'))
 
 
-def check_ip(ip, port):
-    try:
-        url = f"http://{ip}:{port}/stat"
-        response = requests.get(url, timeout=1)  # 设置超时为1秒
-        if response.status_code == 200 and 'Multi stream daemon' in response.text:
-            print(f"扫描到有效ip: {ip}:{port}")
-            return f"{ip}:{port}"
-    except requests.RequestException:
-        return None
-    return None
-
-
 def generate_ips(ip_part, option):
-    a, b, c, d = map(int, ip_part.split('.'))
+    # 返回整数地址区间，由扫描引擎按需转换为字符串
+    base = scan_engine.ip_to_int(ip_part)
     if option == 0:
-        return [f"{a}.{b}.{c}.{d}" for d in range(1, 256)]
+        base &= 0xFFFFFF00
+        return range(base + 1, base + 256)
     else:
-        return [f"{a}.{b}.{c}.{d}" for c in range(0, 256) for d in range(0, 256)]
-
+        base &= 0xFFFF0000
+        return range(base, base + 65536)
 
-def save_to_file(foldername, filename, valid_ips):
-    if not os.path.exists(foldername):
-        os.makedirs(foldername)
 
-    current_date = datetime.now().strftime("%Y%m%d")
-    filename = f"{current_date}_{filename}"
-
-    filepath = os.path.join(foldername, filename)
-
-    with open(filepath, 'w') as f:
-        for ip in valid_ips:
-            f.write(f"{ip}\n")
+def save_to_file(foldername, filename, valid_ips, province, operator):
+    # 写入结果库，再导出最近发现的有效ip，不再每天生成新文件；
+    # 使用单独的结果库，导出的文件不会混入 main.py 扫描到的同省主机
+    store = result_store.ResultStore(os.path.join(foldername, 'dxzb_results.db'))
+    store.seed(province, operator, os.path.join(foldername, filename))
+    store.upsert(province, operator, [(ip, f"http://{ip}/stat") for ip in valid_ips])
+    store.export(province, operator, os.path.join(foldername, filename), fmt="ip_port")
+    store.close()
 
 
 def read_config(config_path):
@@ -130,36 +116,12 @@ if should_run():
         print(f"开始扫描 地址: {ip_part}, 端口: {port}, 类型: {option} （默认类型为0扫描D段，类型为1时扫描C,D段）")
         ips_to_check = generate_ips(ip_part, option)
 
-        valid_ips = []
-        total_ips = len(ips_to_check)
-        checked_count = [0]
-
-
-        def update_status(checked_count):
-            while checked_count[0] < total_ips:
-                print(f"扫描数量: {checked_count[0]}, 有效数量: {len(valid_ips)}")
-                time.sleep(10)
-
-
-        # 启动状态更新线程
-        status_thread = threading.Thread(target=update_status, args=(checked_count,))
-        status_thread.start()
-
-        max_workers = 200 if option == 0 else 100  # 扫描IP线程数量
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_ip = {executor.submit(check_ip, ip, port): ip for ip in ips_to_check}
-            for future in as_completed(future_to_ip):
-                ip = future_to_ip[future]
-                result = future.result()
-                if result is not None:
-                    valid_ips.append(result)
-                checked_count[0] += 1
-
-        # 等待状态线程结束
-        status_thread.join()
+        hits = scan_engine.sweep(ips_to_check, port, keywords=('Multi stream daemon',),
+                                 timeout=1, on_hit=lambda ip_port, url: print(f"扫描到有效ip: {ip_port}"))
+        valid_ips = [ip_port for ip_port, _ in hits]
         all_valid_ips.extend(valid_ips)
 
-    save_to_file('ip', 'ip.txt', all_valid_ips)
+    save_to_file('ip', 'ip.txt', all_valid_ips, '湖南', '电信')
 
     for ip in all_valid_ips:
         print(ip)
@@ -180,8 +142,8 @@ if should_run():
     print(f"共扫描获取到有效IP {len(all_valid_ips)} 个，已全部匹配到湖南_组播.txt文件中。\n")
 
 # 开始对组播源频道列表进行下载速度检测
-# 定义一个全局队列，用于存储需要测速的频道信息
-speed_test_queue = Queue()
+# 定义一个全局队列，用于存储需要测速的频道信息，按主机轮流取出，同一主机不同时测速
+speed_test_queue = speed_engine.HostScheduler()
 
 # 用于存储测速结果的列表
 speed_results = []
@@ -195,33 +157,22 @@ def load_channels_to_speed_test():
             if len(channel_info) >= 2:  # 假设至少有名称和URL
                 name, url = channel_info[:2]  # 只取名称和URL
                 speed_test_queue.put((name, url))
+    speed_test_queue.close()
 
 
 # 执行下载速度测试
 def download_speed_test():
-    while not speed_test_queue.empty():
+    while True:
         channel = speed_test_queue.get()
+        if channel is None:
+            break
         name, url = channel
-        download_time = 5  # 设置下载时间为 5 秒
-        chunk_size = 1024  # 设置下载数据块大小为 1024 字节
-
-        try:
-            start_time = time.time()
-            response = requests.get(url, stream=True, timeout=download_time)
-            response.raise_for_status()
-            size = 0
-            for chunk in response.iter_content(chunk_size=chunk_size):
-                size += len(chunk)
-                if time.time() - start_time >= download_time:
-                    break
-            download_time = time.time() - start_time
-            download_rate = round(size / download_time / 1024 / 1024, 2)
-        except requests.RequestException as e:
-            print(f"请求异常: {e}")
-            download_rate = 0
+        # 最长下载 5 秒，速度稳定或明显过慢时提前结束
+        stats = speed_engine.measure(url, duration=5)
+        download_rate = round(stats["speed"], 2)
 
         print(f"{name},{url}, {download_rate} MB/s")
-        speed_test_queue.task_done()
+        speed_test_queue.done(channel)
         speed_results.append((download_rate, name, url))
 
 
@@ -265,33 +216,15 @@ def natural_key(string):
 
 
 def group_and_sort_channels(channels):
-    groups = {
-        '央视频道,#genre#': [],
-        '卫视频道,#genre#': [],
-        '湖南频道,#genre#': [],
-        '其他频道,#genre#': []
-    }
+    classifier = classify.default()
+    groups = {category: [] for category in classifier.categories}
 
     for name, url, speed in channels:
-        if 'cctv' in name.lower():
-            groups['央视频道,#genre#'].append((name, url, speed))
-        elif '卫视' in name or '凤凰' in name or '翡翠' in name or 'CHC' in name:
-            groups['卫视频道,#genre#'].append((name, url, speed))
-        elif ('湖南' in name or '金鹰' in name or '长沙' in name or '娄底' in name or '岳阳' in name or '张家界' in name
-              or '常德' in name or '怀化' in name or '新化' in name or '株洲' in name or '桂东' in name or '武冈' in name
-              or '永州' in name or '津市' in name or '浏阳' in name or '湘潭' in name or '湘西' in name or '溆浦' in name
-              or '益阳' in name or '衡阳' in name or '道县' in name or '邵阳' in name or '郴州' in name or '双峰' in name
-              or '东安' in name or '中方' in name or '会同' in name or '双牌' in name or '城步' in name or '宁乡' in name
-              or '宁远' in name or '岳麓' in name or '新田' in name or '桃源' in name or '江华' in name or '江永' in name
-              or '汨罗' in name or '洪江' in name or '涟源' in name or '湘江' in name or '祁阳' in name or '芷江' in name
-              or '蓝山' in name or '辰溪' in name or '通道' in name or '靖州' in name or '麻阳' in name):
-            groups['湖南频道,#genre#'].append((name, url, speed))
-        else:
-            groups['其他频道,#genre#'].append((name, url, speed))
-
-        # 对每组进行排序
-        for group in groups.values():
-            group.sort(key=lambda x: (natural_key(x[0]), -float(x[2]) if x[2] is not None else float('-inf')))
+        groups[classifier.classify(name)].append((name, url, speed))
+
+    # 对每组进行排序
+    for group in groups.values():
+        group.sort(key=lambda x: (natural_key(x[0]), -float(x[2]) if x[2] is not None else float('-inf')))
 
     # 筛选相同名称的频道，只保存10个
     filtered_groups = {}
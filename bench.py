@@ -0,0 +1,164 @@
+import os
+import gc
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，只统计 tracemalloc 峰值
+    resource = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+import fake_udpxy
+import metrics
+import main
+import zubo_test
+
+TOLERANCE = 0.2  # 与基准相比吞吐下降或内存增长超过该比例视为退化
+
+
+def max_rss_kb():
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def stage(name, fn, count, unit, trace=True):
+    """运行一个测试阶段，返回耗时、吞吐及内存峰值；各阶段前清除探测缓存，都从完整扫描开始"""
+    if os.path.exists('ip'):
+        shutil.rmtree('ip')
+    gc.collect()
+    if trace:
+        tracemalloc.start()
+    start = time.time()
+    detail = fn()
+    seconds = time.time() - start
+    peak = tracemalloc.get_traced_memory()[1] if trace else 0
+    if trace:
+        tracemalloc.stop()
+    result = {"stage": name, "seconds": round(seconds, 3), "count": count, "unit": unit,
+              "rate": round(count / max(seconds, 1e-6), 2), "peak_kb": peak // 1024, "rss_kb": max_rss_kb()}
+    result.update(detail or {})
+    print(f"[基准] {name}: {count} {unit}，用时 {seconds:.2f}s，{result['rate']} {unit}/s，"
+          f"内存峰值 {result['peak_kb']}KB")
+    return result
+
+
+def write_channels(farm, path, per_host):
+    """为农场中每个主机（含无服务及不响应的主机）生成 per_host 个频道"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for ip in farm.kinds:
+            for n in range(1, per_host + 1):
+                f.write(f"CCTV{n},http://{ip}:{farm.port}/udp/239.0.0.{n}:1234\n")
+    return len(farm.kinds) * per_host
+
+
+def write_merge_input(path, lines, seed=1):
+    """生成大规模未测速组播列表，只用于测试合并，不会访问其中的地址"""
+    rng = random.Random(seed)
+    names = [f"CCTV{n} 综合[1920x1080]" for n in range(1, 18)] + [f"CCTV-{n}高清" for n in range(1, 18)]
+    names += [f"{p}卫视{q}" for p in ("湖南", "浙江", "江苏", "东方", "北京", "广东") for q in ("", "高清", "标清")]
+    with open(path, 'w', encoding='utf-8') as f:
+        for _ in range(lines):
+            host = f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}:4022"
+            f.write(f"{rng.choice(names)},http://{host}/udp/239.1.{rng.randrange(256)}.{rng.randrange(256)}:5140\n")
+
+
+def run(args):
+    farm = fake_udpxy.Farm(args.prefix, args.hosts, args.port, int(args.rate * 1024 * 1024),
+                           args.dead, args.slow, args.tarpit)
+    expected = set(farm.alive())
+    print(f"模拟udpxy: {args.hosts} 个主机，正常 {len(farm.alive(('ok',)))}，慢速 {len(farm.alive(('slow',)))}，"
+          f"不响应 {len(farm.alive(('tarpit',)))}，无服务 {len(farm.alive(('dead',)))}")
+    results = []
+    try:
+        # D段扫描共255个地址
+        def scan_ips():
+            found = set(main.scan_ips(f"{args.prefix}.1", args.port, 0))
+            return {"found": len(found), "missed": len(expected - found)}
+        results.append(stage("main.scan_ips", scan_ips, 255, "地址", args.trace))
+
+        def scan_ip_port():
+            found = zubo_test.scan_ip_port(f"{args.prefix}.1", args.port, 0, "/status")
+            return {"found": len(found)}
+        results.append(stage("zubo_test.scan_ip_port", scan_ip_port, 255, "地址", args.trace))
+
+        channels = write_channels(farm, "bench_组播.txt", args.channels)
+
+        def speed_test():
+            main.speed_test()
+            nbytes = sum(b for b, _ in metrics.registry.transfers.values())
+            return {"mb": round(nbytes / 1024 / 1024, 2)}
+        results.append(stage("main.speed_test", speed_test, channels, "频道", args.trace))
+    finally:
+        farm.close()
+
+    write_merge_input("merge_组播.txt", args.merge_lines)
+
+    def merge_files():
+        main.merge_files()
+        with open("iptv_list.txt", encoding='utf-8') as f:
+            return {"output_lines": sum(1 for _ in f)}
+    results.append(stage("main.merge_files", merge_files, args.merge_lines + channels, "行", args.trace))
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """与基准结果比较，返回退化的阶段说明"""
+    previous = {r["stage"]: r for r in baseline}
+    regressions = []
+    for r in results:
+        base = previous.get(r["stage"])
+        if not base:
+            continue
+        if r["rate"] < base["rate"] * (1 - tolerance):
+            regressions.append(f"{r['stage']} 吞吐 {base['rate']} -> {r['rate']} {r['unit']}/s")
+        if base["peak_kb"] and r["peak_kb"] > base["peak_kb"] * (1 + tolerance):
+            regressions.append(f"{r['stage']} 内存峰值 {base['peak_kb']} -> {r['peak_kb']} KB")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="在本地模拟udpxy主机上测试扫描、测速及合并的性能")
+    parser.add_argument('--prefix', default='127.0.77', help="模拟主机所在的回环网段")
+    parser.add_argument('--port', type=int, default=18099)
+    parser.add_argument('--hosts', type=int, default=32, help="模拟主机数量（不超过254）")
+    parser.add_argument('--dead', type=float, default=0.25, help="无服务主机比例")
+    parser.add_argument('--slow', type=float, default=0.1, help="慢速主机比例")
+    parser.add_argument('--tarpit', type=float, default=0.05, help="只连接不响应的主机比例")
+    parser.add_argument('--rate', type=float, default=2, help="正常主机发送速度 MB/s")
+    parser.add_argument('--channels', type=int, default=4, help="每个主机的测速频道数")
+    parser.add_argument('--merge-lines', type=int, default=20000, help="合并测试的组播列表行数")
+    parser.add_argument('--no-trace', dest='trace', action='store_false',
+                        help="不用 tracemalloc 统计内存，吞吐更接近实际")
+    parser.add_argument('--json', help="结果保存为JSON文件，可作为之后的基准")
+    parser.add_argument('--baseline', help="与之前保存的JSON结果比较，退化时返回非0")
+    args = parser.parse_args()
+
+    # 在临时目录中运行，扫描缓存、测速及合并结果不影响仓库文件
+    workdir = tempfile.mkdtemp(prefix="iptv_bench_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        results = run(args)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f))
+        for line in regressions:
+            print(f"[退化] {line}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,123 @@
+import re
+import os
+import unicodedata
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ALIAS_FILE = os.path.join(BASE_DIR, 'channel_alias.txt')
+
+# 清晰度、编码标签，匹配后从频道名中去掉
+RESOLUTION = re.compile(r'\[(\d{3,4})[x×](\d{3,4})\]', re.IGNORECASE)
+UHD = re.compile(r'[\[(（]?(?<!\d)([48])k(?:hdr)?[\])）]?|超高清', re.IGNORECASE)
+# 码率（12M）、帧率（_25fps）、试看等标注不区分频道，一并去掉；只去掉名称末尾或用分隔符隔开的标注，
+# 高清电影、CHC高清电影、NewTV超清电影等名称中间的“高清”是频道名的一部分
+QUALITY = re.compile(r'(?<=.)(?:超清|高清|标清|宽色域|[(（]试[看用][)）]|_?\d{2}fps|(?<![A-Za-z\d])(?:HD|SD|50P|\d{1,2}M))'
+                     r'(?=$|[\s\-_·\[\]()（）])', re.IGNORECASE)
+CODEC = re.compile(r'[\[(（]?(AVS2|AVS\+|H\.?265|HEVC)[\])）]?', re.IGNORECASE)
+SEPARATORS = re.compile(r'[\[(（]\s*[\])）]|^[\s\-_·]+|[\s\-_·]+$')
+SPACES = re.compile(r'\s+')
+CJK_SPACES = re.compile(r'\s*-?\s+(?=[一-鿿])|(?<=[一-鿿])\s+')
+# CCTV1 综合 / CCTV-1 / CCTV4K 等统一为 CCTV1、CCTV4K
+NUMBERED = re.compile(r'^(CCTV|CETV)[\s\-]*(\d{1,2}\+?|[48]K)(?![\dK])\s*[一-鿿·]*$', re.IGNORECASE)
+
+
+def load_aliases(path):
+    """读取别名表，返回 {别名(大写): 标准名}"""
+    aliases = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = [p.strip() for p in line.split(',', 1)]
+            name = parts[0]
+            aliases[name.upper()] = name
+            if len(parts) > 1:
+                for alias in parts[1].split('|'):
+                    if alias.strip():
+                        aliases[clean(alias).upper()] = name
+    return aliases
+
+
+def clean(name):
+    """合并空白，去掉首尾分隔符及中文前后的空格"""
+    name = SEPARATORS.sub('', SPACES.sub(' ', SEPARATORS.sub('', name)))
+    return CJK_SPACES.sub('', name).strip()
+
+
+class Normalizer:
+    """把原始频道名映射为标准频道ID及清晰度/编码标签，结果按原始名缓存
+
+    “CCTV4k 超高清50P[3840x2160]”与“CCTV4K[4k]”都得到 CCTV4K；高清、标清及分辨率不同的同一频道合并，
+    只有4K/8K与特殊编码（AVS2、H265）作为标签并入显示名，因为普通播放器未必能播放。
+    """
+
+    def __init__(self, aliases=None):
+        self.aliases = aliases or {}
+        self.cache = {}
+
+    def parse(self, raw):
+        """返回 (标准频道ID, {"res": ..., "codec": ...})"""
+        name = unicodedata.normalize('NFKC', raw).strip()
+        tags = {"res": None, "codec": None}
+
+        match = RESOLUTION.search(name)
+        if match:
+            height = int(match.group(2))
+            tags["res"] = "4K" if height >= 2160 else "HD" if height >= 720 else "SD"
+            name = RESOLUTION.sub(' ', name)
+        match = CODEC.search(name)
+        if match:
+            tags["codec"] = match.group(1).upper().replace('.', '')
+            name = CODEC.sub(' ', name)
+        match = UHD.search(name)
+        if match:
+            tags["res"] = f"{match.group(1)}K" if match.group(1) else "4K"
+            name = UHD.sub(' ', name)
+        # 去掉末尾的标注后，前面紧挨着的标注成为新的末尾，如“高清50P”，重复到没有可去掉的标注
+        match = QUALITY.search(name)
+        while match:
+            if tags["res"] is None:
+                tags["res"] = "SD" if match.group(0).upper() in ("标清", "SD") else "HD"
+            name = QUALITY.sub(' ', name).rstrip()
+            match = QUALITY.search(name)
+        name = clean(name)
+
+        channel = self.aliases.get(name.upper())
+        if channel is None:
+            match = NUMBERED.match(name)
+            if match:
+                channel = f"{match.group(1)}{match.group(2)}".upper()
+            elif tags["res"] in ("4K", "8K") and NUMBERED.match(f"{name}{tags['res']}"):
+                # CCTV4k 超高清 去掉4k后只剩 CCTV
+                channel = f"{name}{tags['res']}".upper()
+            else:
+                channel = name or raw.strip()
+        return channel, tags
+
+    def normalize(self, raw):
+        """返回输出用的标准频道名：频道ID，4K/8K及特殊编码作为后缀"""
+        key = self.cache.get(raw)
+        if key is None:
+            channel, tags = self.parse(raw)
+            key = channel
+            if tags["res"] in ("4K", "8K") and tags["res"] not in channel.upper():
+                key += f" {tags['res']}"
+            if tags["codec"]:
+                key += f" {tags['codec']}"
+            self.cache[raw] = key
+        return key
+
+
+_default = None
+
+
+def default():
+    """由 channel_alias.txt 构建的规范化器，首次使用时加载，之后复用"""
+    global _default
+    if _default is None:
+        _default = Normalizer(load_aliases(ALIAS_FILE) if os.path.exists(ALIAS_FILE) else {})
+    return _default
+
+
+def normalize(name):
+    return default().normalize(name)
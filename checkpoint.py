@@ -0,0 +1,77 @@
+import os
+import json
+import time
+import shard
+
+CHECKPOINT_FILE = os.path.join('ip', 'checkpoint.json')
+CHECKPOINT_INTERVAL = float(os.environ.get("CHECKPOINT_INTERVAL", 30))  # 断点保存间隔(秒)
+CHECKPOINT_TTL = float(os.environ.get("CHECKPOINT_TTL_HOURS", 24)) * 3600  # 断点有效期，过期后重新扫描
+
+# 当前启用的断点记录，None 表示不记录
+active = None
+
+
+class Checkpoint:
+    """记录每个扫描任务已完成的/24网段和已发现的有效地址，定期写入状态文件，中断后可从断点继续
+
+    断点记录创建时间，继续运行不会延长有效期；超过 CHECKPOINT_TTL 的断点丢弃，避免一直沿用过时的结果。
+    """
+
+    def __init__(self, path=None, resume=False):
+        root, ext = os.path.splitext(CHECKPOINT_FILE)
+        self.path = path or root + shard.suffix() + ext
+        self.sweeps = {}
+        self.created = time.time()
+        self.saved = time.time()
+        if resume and os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            created = data.get("created", 0)
+            if time.time() - created >= CHECKPOINT_TTL:
+                print(f"断点已超过有效期 {CHECKPOINT_TTL / 3600:g} 小时，重新开始扫描")
+            else:
+                self.created = created
+                self.sweeps = data["sweeps"]
+                done = sum(1 for s in self.sweeps.values() if s["done"])
+                print(f"从断点继续：已完成扫描任务 {done} 个，进行中 {len(self.sweeps) - done} 个")
+
+    def sweep(self, key):
+        return self.sweeps.setdefault(key, {"done": False, "blocks": [], "hits": {}})
+
+    def block_done(self, key, block):
+        self.sweep(key)["blocks"].append(block)
+        self.maybe_save()
+
+    def hit(self, key, ip_port, url):
+        self.sweep(key)["hits"][ip_port] = url
+        self.maybe_save()
+
+    def finish(self, key, hits):
+        state = self.sweep(key)
+        state.update(done=True, blocks=[], hits=dict(hits))
+        self.save()
+
+    def maybe_save(self):
+        if time.time() - self.saved >= CHECKPOINT_INTERVAL:
+            self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({"created": int(self.created), "sweeps": self.sweeps}, f, ensure_ascii=False)
+        os.replace(self.path + '.tmp', self.path)
+        self.saved = time.time()
+
+    def clear(self):
+        """扫描任务全部完成时删除断点文件，仍有未完成任务时保留，供下次 --resume 继续"""
+        if not all(s["done"] for s in self.sweeps.values()):
+            self.save()
+            print(f"仍有未完成的扫描任务，断点已保存: {self.path}")
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def enable(resume=False):
+    global active
+    active = Checkpoint(resume=resume)
+    return active
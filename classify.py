@@ -0,0 +1,87 @@
+import re
+import os
+import glob
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RULES_FILE = os.path.join(BASE_DIR, 'genre_rules.txt')
+PROVINCE_RULES = os.path.join(BASE_DIR, 'zubo', '*_rules.txt')
+
+
+def load_rules(path):
+    """读取分类规则文件，返回 ([(分类名, [关键词, ...], 排序), ...], {别名: 分类名})"""
+    rules = []
+    aliases = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = [p.strip() for p in line.split(',')]
+            if line.startswith('@'):
+                if len(parts) >= 2:
+                    aliases[parts[0][1:]] = parts[1]
+                continue
+            keywords = [k.strip().lower() for k in parts[1].split('|') if k.strip()] if len(parts) > 1 else []
+            order = int(parts[2]) if len(parts) > 2 and parts[2] else None
+            rules.append((parts[0], keywords, order))
+    return rules, aliases
+
+
+class Classifier:
+    """频道分类器：同名分类的关键词合并后编译为一个正则，按排序依次匹配，结果按频道名缓存"""
+
+    def __init__(self, rules, aliases=None):
+        aliases = aliases or {}
+        merged = {}
+        self.default = None
+        for index, (category, keywords, order) in enumerate(rules):
+            category = aliases.get(category, category)
+            if not keywords:
+                self.default = self.default or category
+                continue
+            entry = merged.setdefault(category, {"keywords": set(), "order": order, "index": index})
+            entry["keywords"].update(keywords)
+            if order is not None and (entry["order"] is None or order < entry["order"]):
+                entry["order"] = order
+
+        self.patterns = []
+        for category, entry in sorted(merged.items(), key=lambda x: (x[1]["order"] is None, x[1]["order"] or 0,
+                                                                     x[1]["index"])):
+            keywords = sorted(entry["keywords"], key=len, reverse=True)
+            pattern = re.compile('|'.join(map(re.escape, keywords)), re.IGNORECASE)
+            self.patterns.append((f"{category},#genre#", pattern))
+        self.default = f"{self.default or '其他频道'},#genre#"
+        self.categories = [genre for genre, _ in self.patterns] + [self.default]
+        self.cache = {}
+
+    def classify(self, name):
+        genre = self.cache.get(name)
+        if genre is None:
+            genre = next((g for g, pattern in self.patterns if pattern.search(name)), self.default)
+            self.cache[name] = genre
+        return genre
+
+
+def load_all(files):
+    rules = []
+    aliases = {}
+    for path in files:
+        file_rules, file_aliases = load_rules(path)
+        rules.extend(file_rules)
+        aliases.update(file_aliases)
+    return Classifier(rules, aliases)
+
+
+_default = None
+
+
+def default():
+    """由 genre_rules.txt 及各省份 zubo/*_rules.txt 构建的分类器，首次使用时编译，之后复用"""
+    global _default
+    if _default is None:
+        _default = load_all([RULES_FILE] + sorted(glob.glob(PROVINCE_RULES)))
+    return _default
+
+
+def classify(name):
+    return default().classify(name)
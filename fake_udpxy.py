@@ -0,0 +1,163 @@
+import time
+import struct
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TS_PACKET = 188
+PMT_PID = 0x1000
+VIDEO_PID = 0x100
+
+
+def ts_packet(pid, cc, payload=b'', pusi=False):
+    header = struct.pack('>BHB', 0x47, (0x4000 if pusi else 0) | pid, 0x10 | cc & 0x0F)
+    return (header + payload).ljust(TS_PACKET, b'\xff')
+
+
+def make_ts(seconds=1, bitrate=2 * 1024 * 1024):
+    """生成带PAT/PMT、连续计数正确的测试TS数据，bitrate为字节/秒"""
+    pat = bytes([0, 0x00, 0xB0, 13, 0, 1, 0xC1, 0, 0, 0, 1, 0xE0 | PMT_PID >> 8, PMT_PID & 0xFF, 0, 0, 0, 0])
+    pmt = bytes([0, 0x02, 0xB0, 18, 0, 1, 0xC1, 0, 0, 0xE1, 0x00, 0xF0, 0,
+                 0x1B, 0xE0 | VIDEO_PID >> 8, VIDEO_PID & 0xFF, 0xF0, 0, 0, 0, 0, 0])
+    packets = []
+    # 包数取640的整数倍，循环发送时各PID的连续计数首尾衔接
+    count = max(seconds * bitrate // TS_PACKET // 640, 1) * 640
+    for i in range(count):
+        if i % 40 == 0:
+            packets.append(ts_packet(0, i // 40, pat, True))
+            packets.append(ts_packet(PMT_PID, i // 40, pmt, True))
+        packets.append(ts_packet(VIDEO_PID, i, bytes(range(184))))
+    return b''.join(packets)
+
+
+class UdpxyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        if server.tarpit:
+            # 接受连接但始终不响应，直到客户端超时断开
+            time.sleep(server.tarpit)
+            self.close_connection = True
+            return
+        if server.delay:
+            time.sleep(server.delay)
+        if self.path in ('/stat', '/status'):
+            body = b'<html><title>udpxy status</title>Multi stream daemon</html>'
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path.startswith('/udp/'):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.stream(server.ts_data, server.rate)
+            self.close_connection = True
+        else:
+            self.send_error(404)
+
+    def stream(self, data, rate):
+        """按 rate(字节/秒) 循环发送TS数据，直到客户端断开"""
+        chunk = TS_PACKET * 70
+        pos = 0
+        start = time.time()
+        sent = 0
+        try:
+            while True:
+                block = data[pos:pos + chunk] or data[:chunk]
+                pos = (pos + len(block)) % len(data)
+                self.wfile.write(block)
+                sent += len(block)
+                delay = sent / rate - (time.time() - start)
+                if delay > 0:
+                    time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError, OSError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeUdpxy(ThreadingHTTPServer):
+    """本地模拟udpxy：/stat、/status 返回状态页，/udp/<组播>:<端口> 按限速发送TS流
+
+    delay 为每个请求响应前的等待(秒)，模拟慢主机；tarpit 非0时接受连接后不响应，保持该秒数后断开。
+    """
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, rate=2 * 1024 * 1024, ts_data=None, delay=0, tarpit=0):
+        super().__init__((host, port), UdpxyHandler)
+        self.rate = rate
+        self.ts_data = ts_data or make_ts()
+        self.delay = delay
+        self.tarpit = tarpit
+
+    @property
+    def address(self):
+        return f"{self.server_address[0]}:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class Farm:
+    """在 prefix.1 ~ prefix.N 的回环地址上启动一组模拟udpxy，均使用同一端口
+
+    按比例设置无服务（连接被拒绝）、慢速及只连接不响应的主机，各类主机在网段内均匀分布，便于重复测试。
+    Linux 下 127.0.0.0/8 均指向本机，无需额外配置地址。
+    """
+
+    def __init__(self, prefix='127.0.77', hosts=32, port=18099, rate=2 * 1024 * 1024,
+                 dead=0.0, slow=0.0, tarpit=0.0, slow_delay=0.5, slow_rate=128 * 1024, tarpit_time=30):
+        self.prefix = prefix
+        self.port = port
+        self.servers = []
+        self.kinds = {}
+        ts_data = make_ts()
+        for i in range(1, hosts + 1):
+            kind = self.kind(i, hosts, dead, slow, tarpit)
+            ip = f"{prefix}.{i}"
+            self.kinds[ip] = kind
+            if kind == 'dead':
+                continue
+            server = FakeUdpxy(ip, port, slow_rate if kind == 'slow' else rate, ts_data,
+                               delay=slow_delay if kind == 'slow' else 0,
+                               tarpit=tarpit_time if kind == 'tarpit' else 0)
+            self.servers.append(server.start())
+
+    @staticmethod
+    def kind(i, hosts, dead, slow, tarpit):
+        # 按序号的小数部分分配类型，比例不变时结果固定
+        position = (i * 0.618033988749895) % 1
+        for kind, share in (('dead', dead), ('slow', slow), ('tarpit', tarpit)):
+            if position < share:
+                return kind
+            position -= share
+        return 'ok'
+
+    def alive(self, kinds=('ok', 'slow')):
+        """返回能正常响应状态页的 ip:port"""
+        return [f"{ip}:{self.port}" for ip, kind in self.kinds.items() if kind in kinds]
+
+    def close(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地模拟udpxy服务")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4022)
+    parser.add_argument('--rate', type=float, default=2, help="发送速度 MB/s")
+    parser.add_argument('--ts', help="循环发送的录制TS文件，不指定则自动生成")
+    parser.add_argument('--delay', type=float, default=0, help="每个请求响应前等待的秒数")
+    parser.add_argument('--tarpit', type=float, default=0, help="接受连接后不响应，保持的秒数")
+    args = parser.parse_args()
+    ts_data = open(args.ts, 'rb').read() if args.ts else None
+    server = FakeUdpxy(args.host, args.port, int(args.rate * 1024 * 1024), ts_data, args.delay, args.tarpit)
+    print(f"模拟udpxy运行于 http://{server.address}")
+    server.serve_forever()
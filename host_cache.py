@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import shard
+import checkpoint
+import scan_engine
+from subnet_scheduler import SubnetScheduler
+
+CACHE_FILE = os.environ.get("HOST_CACHE", os.path.join('ip', 'host_cache.json'))
+HOST_TTL = float(os.environ.get("HOST_TTL_HOURS", 48)) * 3600    # 探测记录有效期
+SWEEP_TTL = float(os.environ.get("SWEEP_TTL_HOURS", 24)) * 3600  # 整段扫描结果有效期，期内只复检已知主机
+SCAN_BUDGET = float(os.environ.get("SCAN_BUDGET", 0))            # 每段扫描的时间预算(秒)，0为不限制
+SCAN_ENOUGH = int(os.environ.get("SCAN_ENOUGH", 0))              # 每个省份有效主机达到该数量即停止扫描，0为不限制
+
+
+class HostCache:
+    """按 ip:port 记录探测结果（是否有效、延迟、时间），保存在本地json文件"""
+
+    def __init__(self, path=None):
+        # 分片运行时每个分片使用独立的缓存文件，避免多个进程互相覆盖
+        root, ext = os.path.splitext(CACHE_FILE)
+        self.path = path or root + shard.suffix() + ext
+        self.hosts = {}
+        self.sweeps = {}
+        self.subnets = {}
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.hosts = data.get("hosts", {})
+            self.sweeps = data.get("sweeps", {})
+            self.subnets = data.get("subnets", {})
+        except Exception as e:
+            print(f"缓存文件读取失败，忽略: {e}")
+
+    def save(self):
+        now = time.time()
+        self.hosts = {k: v for k, v in self.hosts.items() if now - v["ts"] < HOST_TTL}
+        self.sweeps = {k: ts for k, ts in self.sweeps.items() if now - ts < SWEEP_TTL}
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({"hosts": self.hosts, "sweeps": self.sweeps, "subnets": self.subnets}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def record(self, ip_port, url, latency):
+        self.hosts[ip_port] = {"ok": bool(url), "url": url, "latency": round(latency, 3), "ts": int(time.time())}
+
+    def known_alive(self, ips, port):
+        """返回整数地址区间 ips 内、端口为 port 且未过期的有效主机"""
+        now = time.time()
+        alive = []
+        for ip_port, entry in self.hosts.items():
+            ip, p = ip_port.rsplit(':', 1)
+            if p == str(port) and entry["ok"] and now - entry["ts"] < HOST_TTL \
+                    and scan_engine.ip_to_int(ip) in ips:
+                alive.append(ip_port)
+        return sorted(alive, key=lambda k: self.hosts[k]["latency"])
+
+    def swept_recently(self, key):
+        return time.time() - self.sweeps.get(key, 0) < SWEEP_TTL
+
+    def mark_swept(self, key):
+        self.sweeps[key] = int(time.time())
+
+
+def incremental_sweep(ips, port, cache=None, budget=SCAN_BUDGET, enough=0, **kwargs):
+    """增量扫描：先复检缓存中的有效主机，再以较低优先级扫描区间内其余地址
+
+    区间在 SWEEP_TTL 内完整扫描过，或超出时间预算 budget 时，跳过整段扫描。
+    其余地址按/24网段历史命中情况排序扫描，有效主机达到 enough 个后提前结束。
+    启用断点记录时，已完成的任务只复检记录的有效地址，未完成的任务跳过已扫完的网段。
+    """
+    cache = cache or HostCache()
+    url_ends = ''.join(kwargs.get('url_ends', ("/stat",)))
+    key = f"{scan_engine.int_to_ip(ips[0])}-{scan_engine.int_to_ip(ips[-1])}:{port}{url_ends}"
+    cp = checkpoint.active
+    state = cp.sweep(key) if cp else None
+    deadline = time.time() + budget if budget else None
+    if state and state["done"]:
+        # 记录的有效地址与缓存中的有效主机一样先复检，不把可能已失效的地址当作本次结果
+        recorded = list(state["hits"])
+        print(f"{key} 断点记录中已完成，复检记录的有效地址 {len(recorded)} 个")
+        hits = scan_engine.scan(recorded, on_result=cache.record, deadline=deadline,
+                                **dict(kwargs, progress_interval=0)) if recorded else []
+        cache.save()
+        return hits
+    known = cache.known_alive(ips, port)
+
+    hits = []
+    complete = True
+    if known:
+        print(f"复检缓存中的有效主机 {len(known)} 个")
+        hits = scan_engine.scan(known, on_result=cache.record, deadline=deadline, **dict(kwargs, progress_interval=0))
+    if enough and len(hits) >= enough:
+        print(f"{key} 复检后有效主机已达 {enough} 个，跳过整段扫描")
+    elif cache.swept_recently(key):
+        print(f"{key} 在有效期内已完整扫描，跳过整段扫描")
+    elif scan_engine.expired(deadline):
+        print(f"{key} 已超出扫描时间预算，跳过整段扫描")
+        complete = False
+    else:
+        skip = {scan_engine.ip_to_int(ip_port.rsplit(':', 1)[0]) for ip_port in known}
+        done_blocks = set(state["blocks"]) if state else ()
+        on_block = (lambda block: cp.block_done(key, block)) if cp else None
+        scheduler = SubnetScheduler(ips, cache.subnets, skip, enough, done_blocks, on_block)
+        if state:
+            found = {ip_port for ip_port, _ in hits}
+            hits.extend((ip_port, url) for ip_port, url in state["hits"].items() if ip_port not in found)
+        scheduler.count(len(hits))
+
+        def record(ip_port, url, latency):
+            n = scan_engine.ip_to_int(ip_port.rsplit(':', 1)[0])
+            if url:
+                cache.record(ip_port, url, latency)
+                scheduler.hit(n)
+                if cp:
+                    cp.hit(key, ip_port, url)
+            scheduler.result(n)
+
+        targets = (f"{scan_engine.int_to_ip(n)}:{port}" for n in scheduler)
+        hits.extend(scan_engine.scan(targets, total=scheduler.total, on_result=record,
+                                     deadline=deadline, **kwargs))
+        if scheduler.stopped:
+            print(f"{key} 有效主机已达 {enough} 个，提前结束扫描")
+        elif scan_engine.expired(deadline):
+            print(f"{key} 扫描达到时间预算，本次未完成")
+            complete = False
+        else:
+            cache.mark_swept(key)
+    if cp and complete:
+        cp.finish(key, hits)
+    elif cp:
+        cp.save()
+    cache.save()
+    return hits
@@ -0,0 +1,24 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+POOL_HOSTS = 100     # 每个线程缓存连接池的主机数量
+POOL_PER_HOST = 4    # 每个主机保持的最大空闲连接数
+
+_local = threading.local()
+
+
+def session():
+    """返回当前线程共用的Session，同一主机的请求复用keep-alive连接"""
+    s = getattr(_local, 'session', None)
+    if s is None:
+        s = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=POOL_PER_HOST)
+        s.mount('http://', adapter)
+        s.mount('https://', adapter)
+        _local.session = s
+    return s
+
+
+def get(url, **kwargs):
+    return session().get(url, **kwargs)
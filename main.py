@@ -1,13 +1,23 @@
 import os
 import re
-import time
+import json
+import hashlib
 import glob
-import requests
-import threading
-from queue import Queue
-from threading import Thread
+import argparse
+import multiprocessing
+import shard
+import scan_engine
+import host_cache
+import scan_plan
+import speed_engine
+import ts_probe
+import result_store
+import classify
+import ranking
+import metrics
+import channel_names
+from urllib.parse import urlparse
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
 def should_run():
@@ -26,22 +36,24 @@ def update_run_time():
 
 
 def check_ip(ip, port):
-    try:
-        url = f"http://{ip}:{port}/stat"
-        resp = requests.get(url, timeout=2)
-        if resp.status_code == 200 and 'Multi stream daemon' in resp.text:
-            print(f"[有效IP] {ip}:{port}")
-            return f"{ip}:{port}"
-    except Exception:
-        return None
+    hits = scan_engine.scan([f"{ip}:{port}"], keywords=('Multi stream daemon',),
+                            timeout=2, on_hit=report_ip, progress_interval=0)
+    return hits[0][0] if hits else None
+
+
+def report_ip(ip_port, url):
+    print(f"[有效IP] {ip_port}")
 
 
 def generate_ips(ip_part, scan_type):
-    a, b, c, d = map(int, ip_part.split('.'))
+    """返回整数地址区间，扫描时逐个转换，不生成完整列表"""
+    base = scan_engine.ip_to_int(ip_part)
     if scan_type == 0:  # D段扫描
-        return [f"{a}.{b}.{c}.{x}" for x in range(1, 256)]
+        base &= 0xFFFFFF00
+        return range(base + 1, base + 256)
     else:  # C+D段扫描
-        return [f"{a}.{b}.{x}.{y}" for x in range(256) for y in range(256)]
+        base &= 0xFFFF0000
+        return range(base, base + 65536)
 
 
 def read_config(config_path):
@@ -63,33 +75,37 @@ def read_config(config_path):
         return []
 
 
-def scan_ips(ip_part, port, scan_type):
+def scan_ips(ip_part, port, scan_type, enough=0):
     print(f"\n开始扫描 {ip_part} 端口 {port} 类型 {scan_type}")
-    valid_ips = []
-    ips = generate_ips(ip_part, scan_type)
-    total = len(ips)
-    checked = [0]
-    
-    def show_progress():
-        while checked[0] < total:
-            print(f"进度: {checked[0]}/{total} 有效: {len(valid_ips)}")
-            time.sleep(10)
-    
-    Thread(target=show_progress, daemon=True).start()
-    
-    with ThreadPoolExecutor(max_workers=200 if scan_type==0 else 100) as executor:
-        futures = {executor.submit(check_ip, ip, port): ip for ip in ips}
-        for future in as_completed(futures):
-            result = future.result()
-            if result:
-                valid_ips.append(result)
-            checked[0] += 1
-    
+    valid_ips = [ip_port for ip_port, _ in scan_range(generate_ips(ip_part, scan_type), port, enough)]
     print(f"扫描完成，有效IP数量: {len(valid_ips)}\n")
     return valid_ips
 
 
-def process_province(config_path):
+def scan_range(ips, port, enough=0, on_hit=report_ip):
+    return host_cache.incremental_sweep(ips, port, keywords=('Multi stream daemon',),
+                                        timeout=2, on_hit=on_hit, enough=enough)
+
+
+def scan_all(config_paths, on_found=None):
+    """合并所有省份配置统一扫描，重复网段只扫一次，返回 {config_path: [ip:port, ...]}
+
+    on_found(config_path, ip_port, url) 在扫描过程中对每个命中立即回调。
+    """
+    entries = []
+    for path in config_paths:
+        for entry in read_config(path):
+            try:
+                ip_port, scan_type = entry
+                ip_part, port = ip_port.split(':', 1)
+                entries.append((path, generate_ips(ip_part, int(scan_type)), port.strip()))
+            except Exception as e:
+                print(f"配置错误: {entry} -> {e}")
+    found = scan_plan.run(entries, scan_range, on_found)
+    return {path: [ip_port for ip_port, _ in found.get(path, [])] for path in config_paths}
+
+
+def process_province(config_path, all_ips=None):
     filename = os.path.basename(config_path)
     if not filename.endswith("_config.txt"):
         return
@@ -97,37 +113,56 @@ def process_province(config_path):
     province, operator = filename.split('_')[:2]
     print(f"\n{'='*30}\n处理: {province} {operator}\n{'='*30}")
     
-    # 扫描IP
-    configs = read_config(config_path)
-    all_ips = []
-    for entry in configs:
-        try:
-            ip_port, scan_type = entry
-            ip_part, port = ip_port.split(':', 1)
-            all_ips.extend(scan_ips(ip_part, port, int(scan_type)))
-        except Exception as e:
-            print(f"配置错误: {entry} -> {e}")
+    # 扫描IP（未传入统一扫描结果时，单独扫描本省配置）
+    if all_ips is None:
+        all_ips = []
+        for entry in read_config(config_path):
+            quota = host_cache.SCAN_ENOUGH - len(all_ips)
+            if host_cache.SCAN_ENOUGH and quota <= 0:
+                print(f"有效IP已达 {host_cache.SCAN_ENOUGH} 个，跳过其余配置")
+                break
+            try:
+                ip_port, scan_type = entry
+                ip_part, port = ip_port.split(':', 1)
+                all_ips.extend(scan_ips(ip_part, port, int(scan_type), max(quota, 0)))
+            except Exception as e:
+                print(f"配置错误: {entry} -> {e}")
     
     # 生成组播
-    tmpl_file = os.path.join('zubo', f"{province}_{operator}.txt")
-    if not os.path.exists(tmpl_file):
-        print(f"缺少模板文件: {tmpl_file}")
+    channels = load_template(province, operator)
+    if channels is None:
         return
     
-    with open(tmpl_file, 'r', encoding='utf-8') as f:
-        channels = [line.strip() for line in f if line.strip()]
-    
     output = []
     for ip in all_ips:
-        output.extend([c.replace("udp://", f"http://{ip}/udp/") for c in channels])
+        output.extend(f"{name},{url}" for name, url in expand_channels(channels, ip))
     
     with open(f"{province}_{operator}_组播.txt", 'w', encoding='utf-8') as f:
         f.write('\n'.join(output))
 
 
+def load_template(province, operator):
+    tmpl_file = os.path.join('zubo', f"{province}_{operator}.txt")
+    if not os.path.exists(tmpl_file):
+        print(f"缺少模板文件: {tmpl_file}")
+        return None
+    
+    with open(tmpl_file, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def expand_channels(channels, ip):
+    """把模板中的组播地址替换为 ip 上的udpxy地址，返回 [(name, url), ...]"""
+    expanded = []
+    for c in channels:
+        if ',' in c:
+            name, url = c.replace("udp://", f"http://{ip}/udp/").split(',', 1)
+            expanded.append((name, url))
+    return expanded
+
+
 def speed_test():
-    speed_queue = Queue()
-    results = []
+    channels = []
     
     # 加载所有组播频道
     for file in glob.glob("*_组播.txt"):
@@ -136,54 +171,102 @@ def speed_test():
                 line = line.strip()
                 if line and ',' in line:
                     name, url = line.split(',', 1)
-                    speed_queue.put((name, url))
-    
-    # 测速线程
-    def worker():
-        while True:
-            try:
-                name, url = speed_queue.get(timeout=10)
-                start = time.time()
-                size = 0
-                try:
-                    with requests.get(url, stream=True, timeout=5) as r:
-                        for chunk in r.iter_content(1024):
-                            size += len(chunk)
-                            if time.time() - start > 5:
-                                break
-                    speed = size / (time.time() - start) / 1024 / 1024
-                except:
-                    speed = 0
-                
-                if speed > 0.1:
-                    results.append((speed, name, url))
-                print(f"[测速] {'✓' if speed>0.1 else '✗'} {name[:20]:<20} {speed:.2f}MB/s")
-                speed_queue.task_done()
-            except:
-                break
+                    channels.append((name, url))
     
     print("\n开始测速...")
-    threads = [Thread(target=worker) for _ in range(20)]
-    [t.start() for t in threads]
-    [t.join() for t in threads]
-    
-    # 排序保存
-    results.sort(reverse=True, key=lambda x: x[0])
+    save_speed_results(speed_engine.run(channels, num_threads=20))
+
+
+def save_speed_results(results):
+    # 按TS流质量评分排序保存
+    results.sort(reverse=True, key=lambda x: ts_probe.score(x[2]))
     with open("speed.txt", "w", encoding='utf-8') as f:
-        f.write('\n'.join([f"{name},{url},{speed:.2f}" for speed, name, url in results]))
+        f.write('\n'.join([f"{name},{url},{ts_probe.format_row(stats)}" for name, url, stats in results]))
+
+
+def scan_and_speed_test(confs):
+    """边扫描边测速：每扫描到一个主机，立即按所属省份模板展开频道送入测速线程
+
+    返回 ({config_path: [ip:port, ...]}, [(name, url, stats), ...])
+    """
+    templates = {}
+    for conf in confs:
+        province, operator = os.path.basename(conf).split('_')[:2]
+        templates[conf] = load_template(province, operator) or []
+    pipeline = speed_engine.SpeedPipeline(num_threads=20)
+    
+    def on_found(conf, ip_port, url):
+        report_ip(ip_port, url)
+        pipeline.add(expand_channels(templates[conf], ip_port))
+    
+    try:
+        found = scan_all(confs, on_found)
+    except BaseException:
+        pipeline.abort()
+        raise
+    print("\n扫描完成，等待测速结束...")
+    return found, pipeline.close()
+
+
+# main.py 的主机及测速结果单独存放，不混入 zubo_test.py 从 ip/results.db 导出的 ip/*_ip.txt
+RESULT_DB = os.path.join('ip', 'main_results.db')
+
+
+def write_results(found, results):
+    for conf, ips in found.items():
+        process_province(conf, ips)
+    save_speed_results(results)
+    
+    # 有效主机及其测速结果写入结果库
+    store = result_store.ResultStore(RESULT_DB)
+    for conf, ips in found.items():
+        province, operator = os.path.basename(conf).split('_')[:2]
+        store.upsert(province, operator, [(ip, f"http://{ip}/stat") for ip in ips])
+    speeds = {}
+    for _, url, stats in results:
+        host = urlparse(url).netloc
+        speeds[host] = max(speeds.get(host, 0), stats["speed"])
+    store.update_speed(speeds)
+    store.close()
+
+
+def run_shard(index, total, by="subnet"):
+    """只扫描测速属于第 index 个分片的网段或省份，结果保存到 shards/ 目录等待合并"""
+    shard.set_shard(index, total, by)
+    metrics.start()
+    confs = [c for c in glob.glob(os.path.join('zubo', '*_config.txt')) if shard.owns_config(c)]
+    print(f"\n运行分片 {index}/{total}（按{'网段' if by == 'subnet' else '省份'}划分），配置文件 {len(confs)} 个")
+    found, results = scan_and_speed_test(confs)
+    shard.save_partial('main', {"found": found, "speed": results})
+    metrics.summary()
+
+
+def merge_shards():
+    """合并各分片结果，生成 *_组播.txt、speed.txt 和最终列表"""
+    found = {}
+    results = {}
+    for partial in shard.load_partials('main'):
+        for conf, ips in partial["found"].items():
+            found.setdefault(conf, [])
+            found[conf].extend(ip for ip in ips if ip not in found[conf])
+        for name, url, stats in partial["speed"]:
+            results[(name, url)] = stats
+    write_results(found, [(name, url, stats) for (name, url), stats in results.items()])
+    merge_files()
+
+
+def run_processes(num, by="subnet"):
+    """本机多进程分片运行后合并"""
+    shard.clear_partials('main')
+    # 每个分片使用新的进程，指标、分片及断点等模块级状态不会带到下一个分片
+    with multiprocessing.Pool(num, maxtasksperchild=1) as pool:
+        pool.starmap(run_shard, [(i, num, by) for i in range(num)])
+    merge_shards()
 
 
 def classify_channel(name):
-    """智能分类频道"""
-    name = name.lower()
-    if 'cctv' in name or '央视' in name or '中央' in name:
-        return "央视频道,#genre#"
-    elif '卫视' in name or '凤凰' in name or '翡翠' in name or '星空' in name:
-        return "卫视频道,#genre#"
-    elif re.search(r'(湖南|长沙|株洲|湘潭|衡阳|岳阳|常德|张家界|郴州|永州)', name):
-        return "湖南频道,#genre#"
-    else:
-        return "其他频道,#genre#"
+    """智能分类频道，规则见 genre_rules.txt"""
+    return classify.classify(name)
 
 
 def natural_sort_key(s):
@@ -192,89 +275,148 @@ def natural_sort_key(s):
             for text in re.split(r'(\d+)', s)]
 
 
+MERGE_STATE = os.path.join('ip', 'merge_state.json')
+
+
+def merge_inputs():
+    """合并结果依赖的全部输入：测速及组播文件、特殊文件、分类规则与别名表"""
+    files = ["speed.txt"] + sorted(glob.glob("*_组播.txt")) + ["AKTV.txt", "hnyd.txt"]
+    files += [classify.RULES_FILE] + sorted(glob.glob(classify.PROVINCE_RULES)) + [channel_names.ALIAS_FILE]
+    return [f for f in files if os.path.exists(f)]
+
+
+def fingerprint(files):
+    """按文件内容计算指纹，TOP_K 变化同样需要重建"""
+    digest = hashlib.sha1(f"top_k={ranking.TOP_K}".encode())
+    for path in files:
+        digest.update(path.encode('utf-8'))
+        with open(path, 'rb') as f:
+            digest.update(hashlib.sha1(f.read()).digest())
+    return digest.hexdigest()
+
+
+def file_hash(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def write_atomic(path, text):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
 def merge_files():
+    """生成 iptv_list.txt；输入未变化或生成内容与现有文件相同时不写入，返回是否更新了文件
+
+    iptv_list.txt 也可能被 DXZB.py、手动修改或 git checkout 改写，只有输入及文件本身都与上次生成时相同才跳过。
+    """
+    inputs_hash = fingerprint(merge_inputs())
+    state = {}
+    if os.path.exists(MERGE_STATE):
+        with open(MERGE_STATE, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    output_hash = file_hash("iptv_list.txt")
+    if output_hash and state.get("inputs") == inputs_hash and state.get("output") == output_hash:
+        print("合并输入未变化，跳过生成 iptv_list.txt")
+        return False
+
     # ================= 第一部分：处理分类内容 =================
-    category_map = {
-        "央视频道,#genre#": [],
-        "卫视频道,#genre#": [],
-        "湖南频道,#genre#": [],
-        "其他频道,#genre#": []
-    }
-
-    # 处理测速文件
+    # 单次遍历：频道名先规范化为标准频道ID，所有来源共用一个索引，
+    # 按频道保留评分最高的 TOP_K 个地址，未测速的地址评分为0，只用于补足
+    categories = classify.default().categories
+    normalize = channel_names.normalize
+    top = ranking.TopK()
+
+    # 处理测速文件，按TS流质量评分
     if os.path.exists("speed.txt"):
         with open("speed.txt", 'r', encoding='utf-8') as f:
             for line in f:
                 line = line.strip()
                 if line.count(',') >= 2:
-                    name, url, _ = line.split(',', 2)
-                    category = classify_channel(name)
-                    category_map[category].append(f"{name},{url}")
+                    name, url, fields = line.split(',', 2)
+                    top.add(normalize(name), url, ts_probe.score(ts_probe.parse_row(fields)))
 
     # 处理组播文件
     for file in glob.glob("*_组播.txt"):
+        with open(file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and ',' in line:
+                    name, url = line.split(',', 1)
+                    top.add(normalize(name), url, 0)
+
+    category_map = {category: [] for category in categories}
+    for name in top.names():
+        category_map[classify_channel(name)].append(name)
+
+    # 特殊文件中已出现在上面分类里的频道并入该频道，其余保留原分类结构；
+    # 多个特殊文件或分类中出现的同一频道只在第一次出现的位置输出
+    special_files = ["AKTV.txt", "hnyd.txt"]
+    classified = set(top.names())
+    special_map = {}
+    for file in special_files:
         if os.path.exists(file):
+            sections = special_map.setdefault(file, {})
+            current_category = ""
             with open(file, 'r', encoding='utf-8') as f:
                 for line in f:
                     line = line.strip()
-                    if line and ',' in line:
+                    if not line:
+                        continue
+                    if line.endswith("#genre#"):
+                        current_category = line
+                    elif ',' in line:
                         name, url = line.split(',', 1)
-                        category = classify_channel(name)
-                        category_map[category].append(f"{name},{url}")
+                        name = normalize(name)
+                        top.add(name, url, 0)
+                        if name not in classified:
+                            classified.add(name)
+                            sections.setdefault(current_category, {})[name] = None
 
-    # 生成分类内容
+    # 生成分类内容，更新时间区块最后再加，便于与现有文件比较
     final_content = []
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    final_content.append(f"更新时间,#genre#\n{current_time},url\n")
     
-    # 分类区块处理
-    for category in ["央视频道,#genre#", "卫视频道,#genre#", "湖南频道,#genre#", "其他频道,#genre#"]:
-        channels = category_map[category]
-        
-        # 去重逻辑
-        unique_channels = {}
-        for chan in channels:
-            name, url = chan.split(',', 1)
-            if name not in unique_channels:
-                unique_channels[name] = []
-            if len(unique_channels[name]) < 10:
-                unique_channels[name].append(url)
-        
-        # 排序处理
-        sorted_channels = []
-        for name in sorted(unique_channels.keys(), key=natural_sort_key):
-            for url in unique_channels[name][:10]:
-                sorted_channels.append(f"{name},{url}")
+    # 分类区块按频道名自然排序
+    for category in categories:
+        sorted_channels = [f"{name},{url}"
+                           for name in sorted(category_map[category], key=natural_sort_key)
+                           for url in top.top(name)]
         
         # 添加分类头
         if sorted_channels:
             final_content.append(f"{category}\n" + "\n".join(sorted_channels))
 
     # ================= 第二部分：追加特殊文件 =================
-    special_files = ["AKTV.txt", "hnyd.txt"]
-    for file in special_files:
-        if os.path.exists(file):
-            with open(file, 'r', encoding='utf-8') as f:
-                # 保持原文件完整结构
-                content = []
-                current_category = ""
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    if line.endswith("#genre#"):
-                        current_category = line
-                        content.append(f"\n{current_category}")
-                    else:
-                        content.append(line)
-                
-                if content:
-                    final_content.append("\n".join(content))
-                    print(f"已追加文件: {file} (共{len(content)}行)")
+    for file, sections in special_map.items():
+        content = []
+        for current_category, names in sections.items():
+            if current_category:
+                content.append(f"\n{current_category}")
+            content.extend(f"{name},{url}" for name in names for url in top.top(name))
+        if content:
+            final_content.append("\n".join(content))
+            print(f"已追加文件: {file} (共{len(content)}行)")
 
     # ================= 写入最终文件 =================
-    with open("iptv_list.txt", "w", encoding='utf-8') as f:
-        f.write("\n\n".join(final_content))
+    # 除更新时间外内容相同则保留原文件，避免无意义的提交；写入经临时文件替换，读取方不会读到半个文件
+    body = "\n\n".join(final_content)
+    changed = True
+    if os.path.exists("iptv_list.txt"):
+        with open("iptv_list.txt", 'r', encoding='utf-8') as f:
+            changed = f.read().split(",url\n\n\n", 1)[-1] != body
+    if changed:
+        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        write_atomic("iptv_list.txt", f"更新时间,#genre#\n{current_time},url\n\n\n{body}")
+    else:
+        print("iptv_list.txt 内容未变化，不写入")
+
+    os.makedirs(os.path.dirname(MERGE_STATE), exist_ok=True)
+    write_atomic(MERGE_STATE, json.dumps({"inputs": inputs_hash, "output": file_hash("iptv_list.txt")}))
+    return changed
 
 
 def main():
@@ -282,18 +424,34 @@ def main():
         print("未达到执行时间间隔")
         return
     
-    update_run_time()
+    metrics.start()
     
-    # 处理所有省份配置
-    for conf in glob.glob(os.path.join('zubo', '*_config.txt')):
-        process_province(conf)
+    # 统一扫描所有省份配置，扫描同时测速，再生成组播文件
+    confs = glob.glob(os.path.join('zubo', '*_config.txt'))
+    write_results(*scan_and_speed_test(confs))
     
-    # 测速和合并
-    speed_test()
-    merge_files()
+    # 合并；列表有变化时才更新时间文件，避免无意义的提交
+    if merge_files():
+        update_run_time()
     
+    metrics.summary()
     print("\n任务完成! 最终列表已保存至 iptv_list.txt")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="扫描组播源、测速并生成直播列表")
+    parser.add_argument('--shard', help="只运行第 i 个分片（格式 i/N），结果保存到 shards/ 目录")
+    parser.add_argument('--shard-by', choices=['subnet', 'province'], default='subnet',
+                        help="分片方式：按/24网段或按省份")
+    parser.add_argument('--processes', type=int, default=0, help="本机按分片启动多个进程运行后合并")
+    parser.add_argument('--merge', action='store_true', help="合并 shards/ 目录中的分片结果")
+    args = parser.parse_args()
+    
+    if args.shard:
+        run_shard(*shard.parse(args.shard), args.shard_by)
+    elif args.merge:
+        merge_shards()
+    elif args.processes:
+        run_processes(args.processes, args.shard_by)
+    else:
+        main()
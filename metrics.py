@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import bisect
+import threading
+import shard
+
+METRICS_FILE = os.environ.get("METRICS_FILE", os.path.join('ip', 'metrics.jsonl'))
+METRICS_INTERVAL = float(os.environ.get("METRICS_INTERVAL", 10))  # 定期写入指标的间隔(秒)，0为不写
+# 直方图桶上界，按近似对数分布，适用于秒级耗时
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+TOP_KEYS = 10  # 分组计数只输出数量最多的前几项
+
+
+class Histogram:
+    """固定分桶直方图，内存与观测次数无关，分位数取所在桶的上界"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0}
+        return {"count": self.count, "mean": round(self.sum / self.count, 4), "min": round(self.min, 4),
+                "max": round(self.max, 4), "p50": self.quantile(0.5), "p90": self.quantile(0.9),
+                "p99": self.quantile(0.99)}
+
+
+class Registry:
+    """计数、分组计数、瞬时值、直方图及按转发主机的吞吐统计，多线程共用"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start = time.time()
+        self.counters = {}
+        self.keyed = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.transfers = {}
+
+    def inc(self, name, n=1, key=None):
+        with self.lock:
+            if key is None:
+                self.counters[name] = self.counters.get(name, 0) + n
+            else:
+                group = self.keyed.setdefault(name, {})
+                group[key] = group.get(key, 0) + n
+
+    def gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def observe(self, name, value):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    def transfer(self, key, nbytes, seconds):
+        """记录从转发主机 key 下载的字节数及耗时"""
+        with self.lock:
+            total = self.transfers.setdefault(key, [0, 0.0])
+            total[0] += nbytes
+            total[1] += seconds
+
+    def snapshot(self, event="progress"):
+        with self.lock:
+            elapsed = max(time.time() - self.start, 1e-6)
+            keyed = {name: dict(sorted(group.items(), key=lambda x: -x[1])[:TOP_KEYS])
+                     for name, group in self.keyed.items()}
+            # 测速耗时最多的转发主机排在前面，便于找出拖慢测速的主机
+            relays = sorted(self.transfers.items(), key=lambda x: -x[1][1])[:TOP_KEYS]
+            return {
+                "event": event,
+                "ts": int(time.time()),
+                "elapsed": round(elapsed, 1),
+                "counters": dict(self.counters),
+                "rates": {name: round(n / elapsed, 2) for name, n in self.counters.items()},
+                "keyed": keyed,
+                "gauges": dict(self.gauges),
+                "histograms": {name: h.summary() for name, h in self.histograms.items()},
+                "relays": {key: {"mb_per_s": round(b / max(s, 1e-6) / 1024 / 1024, 3), "seconds": round(s, 1)}
+                           for key, (b, s) in relays},
+            }
+
+
+registry = Registry()
+inc = registry.inc
+gauge = registry.gauge
+observe = registry.observe
+transfer = registry.transfer
+
+
+def path():
+    root, ext = os.path.splitext(METRICS_FILE)
+    return root + shard.suffix() + ext
+
+
+def write(event="progress"):
+    """追加一行JSON格式的指标快照"""
+    snapshot = registry.snapshot(event)
+    os.makedirs(os.path.dirname(path()) or '.', exist_ok=True)
+    with open(path(), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(snapshot, ensure_ascii=False) + "\n")
+    return snapshot
+
+
+_reporter = None
+
+
+def start(interval=METRICS_INTERVAL):
+    """清空上次运行的指标文件，启动后台线程定期写入指标，守护线程不会阻止进程退出"""
+    global _reporter
+    if _reporter:
+        return
+    if os.path.exists(path()):
+        os.remove(path())
+    if not interval:
+        return
+
+    def run():
+        while True:
+            time.sleep(interval)
+            write()
+
+    _reporter = threading.Thread(target=run, daemon=True)
+    _reporter.start()
+
+
+def summary():
+    """写入最终指标并打印汇总"""
+    s = write("summary")
+    c, h = s["counters"], s["histograms"]
+    print(f"\n{'=' * 25}\n   运行指标汇总 (用时 {s['elapsed']}s)\n{'=' * 25}")
+    if c.get("scan.probes"):
+        print(f"探测: {c['scan.probes']} 个地址，{s['rates']['scan.probes']}/s，有效 {c.get('scan.hits', 0)} 个")
+        print(f"TCP连接: 超时 {c.get('scan.connect_timeout', 0)}，拒绝 {c.get('scan.connect_refused', 0)}，"
+              f"不可达 {c.get('scan.connect_unreachable', 0)}，本机资源不足 {c.get('scan.connect_local', 0)}，"
+              f"耗时 {h.get('scan.connect', {})}")
+        print(f"HTTP请求: 超时 {c.get('scan.http_timeout', 0)}，出错 {c.get('scan.http_error', 0)}，"
+              f"耗时 {h.get('scan.http', {})}")
+        if s["keyed"].get("scan.hits_per_24"):
+            print(f"有效地址最多的/24网段: {s['keyed']['scan.hits_per_24']}")
+    if c.get("speed.tests"):
+        print(f"测速: {c['speed.tests']} 个频道，有效 {c.get('speed.ok', 0)} 个，首包时间 {h.get('speed.ttfp', {})}")
+        for key, relay in s["relays"].items():
+            print(f"  {key}: {relay['mb_per_s']}MB/s，测速 {relay['seconds']}s")
+    print(f"详细指标已写入 {path()}")
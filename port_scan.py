@@ -0,0 +1,195 @@
+import sys
+import json
+import time
+import errno
+import asyncio
+import argparse
+from ipaddress import ip_network
+
+# 只依赖标准库，图形界面打包及CI中均可直接使用
+DEFAULT_CONCURRENCY = 500
+DEFAULT_TIMEOUT = 1
+PROGRESS_INTERVAL = 0.2
+# 本机文件句柄、端口或缓冲区耗尽，与目标无关，稍后重试同一地址
+LOCAL_ERRNOS = {errno.EMFILE, errno.ENFILE, errno.EADDRNOTAVAIL, errno.ENOBUFS}
+UNREACHABLE_ERRNOS = {errno.EHOSTUNREACH, errno.ENETUNREACH}
+LOCAL_RETRIES = 5
+LOCAL_RETRY_DELAY = 0.1  # 每次重试间隔加倍
+
+
+async def connect(ip, port, timeout):
+    """非阻塞TCP连接测试，返回 (结果, 耗时)
+
+    结果为 open、timeout、refused、unreachable（主机或网络不可达，与超时一样视为无服务）、
+    local（本机资源耗尽，目标未被测试）或 error。
+    """
+    begin = time.time()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip, int(port)), timeout)
+    except asyncio.TimeoutError:
+        return "timeout", time.time() - begin
+    except ConnectionRefusedError:
+        return "refused", time.time() - begin
+    except OSError as e:
+        if e.errno in LOCAL_ERRNOS:
+            return "local", time.time() - begin
+        if e.errno in UNREACHABLE_ERRNOS:
+            return "unreachable", time.time() - begin
+        return "error", time.time() - begin
+    except Exception:
+        return "error", time.time() - begin
+    rtt = time.time() - begin
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except Exception:
+        pass
+    return "open", rtt
+
+
+async def connect_retry(ip, port, timeout, on_local=None):
+    """同 connect，本机资源耗尽时等待后重试，避免地址未经测试就被跳过；每次出现时回调 on_local()"""
+    delay = LOCAL_RETRY_DELAY
+    for attempt in range(LOCAL_RETRIES + 1):
+        state, rtt = await connect(ip, port, timeout)
+        if state != "local":
+            break
+        if on_local:
+            on_local()
+        if attempt < LOCAL_RETRIES:
+            await asyncio.sleep(delay)
+            delay *= 2
+    return state, rtt
+
+
+def parse_networks(items):
+    """CIDR或单个地址列表，可用逗号分隔"""
+    return [ip_network(part.strip(), strict=False) for item in items for part in item.split(',') if part.strip()]
+
+
+def parse_ports(text):
+    """端口范围，如 80,443,8000-8100"""
+    ports = []
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        start, _, end = part.partition('-')
+        if not (start.strip().isdigit() and (end or start).strip().isdigit()):
+            raise ValueError(f"端口范围错误: {part}")
+        start, end = int(start), int(end or start)
+        if not (0 < start <= end <= 65535):
+            raise ValueError(f"端口范围错误: {part}")
+        ports.append(range(start, end + 1))
+    return ports
+
+
+def host_count(network):
+    """与 network.hosts() 的数量一致：IPv4 去掉网络及广播地址，IPv6 去掉子网路由器任播地址"""
+    count = network.num_addresses
+    if network.version == 4 and network.prefixlen < 31:
+        count -= 2
+    elif network.version == 6 and network.prefixlen < 127:
+        count -= 1
+    return count
+
+
+def total(networks, ports):
+    return sum(host_count(n) for n in networks) * sum(len(r) for r in ports)
+
+
+def targets(networks, ports):
+    """按需生成 (主机, 端口)，不预先生成完整列表"""
+    return ((str(ip), port) for network in networks for ip in network.hosts() for r in ports for port in r)
+
+
+async def sweep(pairs, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT, on_open=None, on_progress=None,
+                progress_interval=PROGRESS_INTERVAL, stop=None):
+    """对 (主机, 端口) 序列发起非阻塞连接，同时在途的连接数不超过 concurrency，返回完成数
+
+    所有连接协程共享同一个迭代器；on_open(ip, port, rtt) 在发现开放端口时回调，
+    on_progress(n) 每隔 progress_interval 秒以这段时间内完成的数量回调一次；stop() 返回True时停止。
+    """
+    pairs = iter(pairs)
+    done = [0, 0]
+
+    async def worker():
+        for ip, port in pairs:
+            if stop and stop():
+                return
+            state, rtt = await connect_retry(ip, port, timeout)
+            if state == "open" and on_open:
+                on_open(ip, port, rtt)
+            done[0] += 1
+
+    def flush():
+        if done[0] > done[1] and on_progress:
+            on_progress(done[0] - done[1])
+        done[1] = done[0]
+
+    async def report():
+        while True:
+            await asyncio.sleep(progress_interval)
+            flush()
+
+    reporter = asyncio.ensure_future(report())
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        reporter.cancel()
+        flush()
+    return done[0]
+
+
+def scan(networks, ports, concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT, on_open=None, on_progress=None):
+    """扫描网段列表上的端口范围，返回开放的 [(ip, port), ...]"""
+    found = []
+
+    def record(ip, port, rtt):
+        found.append((ip, port))
+        if on_open:
+            on_open(ip, port, rtt)
+
+    asyncio.run(sweep(targets(networks, ports), min(concurrency, max(total(networks, ports), 1)), timeout,
+                      record, on_progress))
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="TCP端口扫描（无界面）")
+    parser.add_argument('networks', nargs='*', help="CIDR网段或地址，可用逗号分隔")
+    parser.add_argument('-f', '--file', help="从文件读取网段，每行一个，#开头为注释")
+    parser.add_argument('-p', '--ports', required=True, help="端口范围，如 80,443,8000-8100")
+    parser.add_argument('-c', '--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="同时进行的连接数")
+    parser.add_argument('-t', '--timeout', type=float, default=DEFAULT_TIMEOUT, help="连接超时(秒)")
+    parser.add_argument('--format', choices=['text', 'jsonl'], default='text', help="输出格式")
+    args = parser.parse_args()
+
+    items = list(args.networks)
+    if args.file:
+        with open(args.file, 'r', encoding='utf-8') as f:
+            items += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    try:
+        networks = parse_networks(items)
+        ports = parse_ports(args.ports)
+    except ValueError as e:
+        parser.error(str(e))
+    count = total(networks, ports)
+    if not count:
+        parser.error("没有需要扫描的地址")
+
+    def output(ip, port, rtt):
+        if args.format == 'jsonl':
+            print(json.dumps({"ip": ip, "port": port, "rtt": round(rtt, 4)}), flush=True)
+        else:
+            print(f"{ip}:{port}", flush=True)
+
+    completed = [0]
+
+    def progress(n):
+        completed[0] += n
+        print(f"\r进度: {completed[0]}/{count} ({completed[0] / count:.2%})", end='', file=sys.stderr)
+
+    start = time.time()
+    found = scan(networks, ports, args.concurrency, args.timeout, output, progress)
+    print(f"\n扫描 {count} 个端口，用时 {time.time() - start:.1f}s，开放 {len(found)} 个", file=sys.stderr)
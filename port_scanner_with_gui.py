@@ -1,10 +1,13 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
 from ipaddress import ip_network
-import socket
+import asyncio
 import threading
 import queue
 import time
+import port_scan
+
+CONNECT_TIMEOUT = 1      # 单个端口连接超时(秒)
 
 class PortScannerGUI:
     def __init__(self):
@@ -39,7 +42,7 @@ class PortScannerGUI:
         self.end_port_entry = ttk.Entry(main_frame, width=10)
         self.end_port_entry.grid(row=2, column=1, sticky=tk.W, pady=2, padx=5)
 
-        ttk.Label(main_frame, text="线程数:").grid(row=3, column=0, sticky=tk.W, pady=2)
+        ttk.Label(main_frame, text="并发数:").grid(row=3, column=0, sticky=tk.W, pady=2)
         self.threads_entry = ttk.Entry(main_frame, width=10)
         self.threads_entry.insert(0, "200")
         self.threads_entry.grid(row=3, column=1, sticky=tk.W, pady=2, padx=5)
@@ -80,7 +83,7 @@ class PortScannerGUI:
                 
             threads = int(self.threads_entry.get())
             if threads <= 0:
-                raise ValueError("线程数必须大于0")
+                raise ValueError("并发数必须大于0")
                 
             return ip_str, start_port, end_port, threads
             
@@ -89,12 +92,7 @@ class PortScannerGUI:
             return None
 
     def calculate_total_tasks(self, network, start_port, end_port):
-        try:
-            ip_count = sum(1 for _ in network.hosts())
-            port_count = end_port - start_port + 1
-            return ip_count * port_count
-        except:
-            return 0
+        return port_scan.total([network], [range(start_port, end_port + 1)])
 
     def start_scan(self):
         if self.scanning:
@@ -135,29 +133,7 @@ class PortScannerGUI:
 
     def run_scan(self, network, start_port, end_port, num_threads):
         try:
-            threads = []
-            for ip in network.hosts():
-                if not self.scanning:
-                    break
-                    
-                port_count = end_port - start_port + 1
-                self.progress_queue.put(port_count)  # 预增进度
-                
-                t = threading.Thread(
-                    target=self.scan_ip,
-                    args=(str(ip), start_port, end_port),
-                    daemon=True
-                )
-                t.start()
-                threads.append(t)
-                
-                while len(threads) >= num_threads:
-                    t = threads.pop(0)
-                    t.join(timeout=0.1)
-                    
-            for t in threads:
-                t.join()
-                
+            asyncio.run(self.sweep(network, start_port, end_port, num_threads))
         except Exception as e:
             self.output_queue.put(f"扫描错误: {str(e)}")
         finally:
@@ -165,22 +141,23 @@ class PortScannerGUI:
             self.scanning = False
             self.root.after(100, lambda: self.start_btn.config(state=tk.NORMAL))
 
-    def scan_ip(self, ip, start_port, end_port):
-        for port in range(start_port, end_port + 1):
-            if not self.scanning:
-                return
-                
-            try:
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(1)
-                result = sock.connect_ex((ip, port))
-                if result == 0:
-                    self.output_queue.put(f"发现开放端口: {ip}:{port}")
-                sock.close()
-            except Exception:
-                pass
-            finally:
-                self.progress_queue.put(1)
+    async def sweep(self, network, start_port, end_port, concurrency):
+        """由 port_scan 引擎扫描，同时在途的连接数不超过 concurrency
+
+        完成数及发现的端口每隔一段时间汇总成一条消息放入队列，界面不会被逐个端口的消息拖慢。
+        """
+        found = []
+
+        def on_progress(n):
+            self.progress_queue.put(n)
+            if found:
+                self.output_queue.put("\n".join(found))
+                found.clear()
+
+        await port_scan.sweep(port_scan.targets([network], [range(start_port, end_port + 1)]),
+                              min(concurrency, self.total_tasks), CONNECT_TIMEOUT,
+                              on_open=lambda ip, port, rtt: found.append(f"发现开放端口: {ip}:{port}"),
+                              on_progress=on_progress, stop=lambda: not self.scanning)
 
     def process_queues(self):
         # 处理输出队列
@@ -0,0 +1,103 @@
+import os
+from collections import deque
+
+# 探测并发自适应：SCAN_CONCURRENCY 为起始值，在 [MIN_CONCURRENCY, MAX_CONCURRENCY] 间调整
+MAX_CONCURRENCY = int(os.environ.get("SCAN_MAX_CONCURRENCY", 0))  # 0为起始值的4倍
+MIN_CONCURRENCY = 32
+INCREASE = 32            # 每个统计窗口无拥塞时增加的并发数
+DECREASE = 0.5           # 出现拥塞时并发乘以该系数
+WINDOW = 200             # 每完成该数量的探测评估一次
+RTT_SAMPLES = 500        # 保留最近成功探测的耗时样本数
+MIN_SAMPLES = 20         # 成功样本不足时沿用配置的超时
+TIMEOUT_PERCENTILE = 0.99
+TIMEOUT_FACTOR = 3       # 超时取成功耗时高分位的倍数，留出余量避免漏掉慢主机
+MIN_CONNECT_TIMEOUT = 0.3
+MIN_HTTP_TIMEOUT = 0.5
+ERROR_RATE = 0.01        # 本机连接错误（文件句柄、端口耗尽等）比例超过该值视为拥塞
+HTTP_TIMEOUT_RATE = 0.2  # 端口已连通但HTTP超时的比例超过该值视为拥塞
+RTT_INFLATION = 2        # 最近连接耗时中位数超过基线该倍数，且至少多出 RTT_MIN_DELTA 秒视为拥塞
+RTT_MIN_DELTA = 0.05
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class AimdController:
+    """按成功探测的耗时分布设置超时，按错误及超时比例加性增、乘性减地调整同时在途的探测数
+
+    扫描大量不存在的地址时连接超时是常态，不作为拥塞信号；拥塞依据本机连接错误、
+    已连通主机的HTTP超时及连接耗时相对基线的增长判断。超时只会在配置值以下收紧，不会放宽。
+    """
+
+    def __init__(self, concurrency, connect_timeout, timeout, max_concurrency=MAX_CONCURRENCY):
+        self.max = max(max_concurrency or concurrency * 4, MIN_CONCURRENCY)
+        self.limit = min(max(concurrency, MIN_CONCURRENCY), self.max)
+        self.connect_ceiling = connect_timeout
+        self.http_ceiling = timeout
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        self.connect_rtts = deque(maxlen=RTT_SAMPLES)
+        self.http_rtts = deque(maxlen=RTT_SAMPLES)
+        self.baseline = None
+        self.reset()
+
+    def reset(self):
+        self.done = 0
+        self.errors = 0
+        self.http_attempts = 0
+        self.http_timeouts = 0
+        self.window_rtts = []
+
+    def connected(self, rtt):
+        """TCP连接得到应答（开放或拒绝）的耗时，拒绝也经过一次完整往返，同样反映网络及本机的拥塞"""
+        self.connect_rtts.append(rtt)
+        self.window_rtts.append(rtt)
+
+    def connect_error(self):
+        """本机资源耗尽导致的连接失败；目标不可达与超时一样不计入"""
+        self.errors += 1
+
+    def http_result(self, rtt=None):
+        """rtt 为None表示HTTP请求超时"""
+        self.http_attempts += 1
+        if rtt is None:
+            self.http_timeouts += 1
+        else:
+            self.http_rtts.append(rtt)
+
+    def finished(self):
+        """每完成一个地址的探测调用一次，返回并发上限是否改变"""
+        self.done += 1
+        if self.done < WINDOW:
+            return False
+        previous = self.limit
+        if self.congested():
+            self.limit = max(MIN_CONCURRENCY, int(self.limit * DECREASE))
+        else:
+            self.limit = min(self.max, self.limit + INCREASE)
+        self.update_timeouts()
+        self.reset()
+        return self.limit != previous
+
+    def congested(self):
+        if self.errors > ERROR_RATE * self.done:
+            return True
+        if self.http_attempts >= 5 and self.http_timeouts > HTTP_TIMEOUT_RATE * self.http_attempts:
+            return True
+        if len(self.window_rtts) >= 5:
+            median = percentile(self.window_rtts, 0.5)
+            if self.baseline is None or median < self.baseline:
+                self.baseline = median
+            elif median > RTT_INFLATION * self.baseline and median - self.baseline > RTT_MIN_DELTA:
+                return True
+        return False
+
+    def update_timeouts(self):
+        if self.connect_ceiling and len(self.connect_rtts) >= MIN_SAMPLES:
+            value = percentile(self.connect_rtts, TIMEOUT_PERCENTILE) * TIMEOUT_FACTOR
+            self.connect_timeout = min(self.connect_ceiling, max(MIN_CONNECT_TIMEOUT, value))
+        if len(self.http_rtts) >= MIN_SAMPLES:
+            value = percentile(self.http_rtts, TIMEOUT_PERCENTILE) * TIMEOUT_FACTOR
+            self.timeout = min(self.http_ceiling, max(MIN_HTTP_TIMEOUT, value))
@@ -0,0 +1,56 @@
+import os
+import heapq
+from urllib.parse import urlparse
+
+TOP_K = int(os.environ.get("TOP_K", 10))   # 每个频道保留的地址数
+POOL_FACTOR = 2     # 候选池为 K 的倍数，留出按主机分散挑选的余地
+
+
+class TopK:
+    """每个频道名用有界最小堆保留评分最高的候选地址，内存与候选总数无关
+
+    输出时按主机轮流排列：先是各主机评分最高的地址，再是各主机第2个地址……，同一轮内按评分、再按url排序，
+    未测速（评分为0）的地址同样分散到不同主机，结果稳定。
+    同一url多次加入（如既在测速结果又在组播文件中）只保留最高评分。
+    """
+
+    def __init__(self, k=TOP_K):
+        self.k = k
+        self.pool = k * POOL_FACTOR
+        self.heaps = {}
+        self.scores = {}  # 频道名 -> {候选池中的url: 评分}
+
+    def add(self, name, url, score):
+        heap = self.heaps.setdefault(name, [])
+        scores = self.scores.setdefault(name, {})
+        previous = scores.get(url)
+        if previous is not None:
+            if score <= previous:
+                return
+            # 候选池很小，直接移除旧评分后重建堆
+            heap.remove((previous, url))
+            heapq.heapify(heap)
+            del scores[url]
+        item = (score, url)
+        if len(heap) < self.pool:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            del scores[heapq.heapreplace(heap, item)[1]]
+        else:
+            return
+        scores[url] = score
+
+    def names(self):
+        return self.heaps.keys()
+
+    def top(self, name):
+        """返回该频道排序后的前 K 个地址"""
+        candidates = sorted(self.heaps.get(name, []), key=lambda x: (-x[0], x[1]))
+        seen = {}
+        ranked = []
+        for score, url in candidates:
+            host = urlparse(url).netloc
+            ranked.append((seen.get(host, 0), -score, url))
+            seen[host] = seen.get(host, 0) + 1
+        ranked.sort()
+        return [url for _, _, url in ranked[:self.k]]
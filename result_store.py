@@ -0,0 +1,106 @@
+import os
+import time
+import sqlite3
+import argparse
+from urllib.parse import urlparse
+
+DB_FILE = os.environ.get("RESULT_DB", os.path.join('ip', 'results.db'))
+ALIVE_HOURS = 48
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hosts (
+    province   TEXT NOT NULL,
+    operator   TEXT NOT NULL,
+    ip_port    TEXT NOT NULL,
+    path       TEXT NOT NULL,
+    first_seen INTEGER NOT NULL,
+    last_seen  INTEGER NOT NULL,
+    last_speed REAL,
+    PRIMARY KEY (ip_port, path, province, operator)
+);
+CREATE INDEX IF NOT EXISTS idx_hosts_seen ON hosts (province, operator, last_seen);
+"""
+
+
+class ResultStore:
+    """有效主机结果库：按 ip:port:状态页 记录首次、最近发现时间和最近测速结果"""
+
+    def __init__(self, path=DB_FILE):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def upsert(self, province, operator, hits):
+        """批量写入扫描结果 [(ip_port, url), ...]，已有记录只更新最近发现时间"""
+        now = int(time.time())
+        rows = [(province, operator, ip_port, urlparse(url).path or '/stat', now, now) for ip_port, url in hits]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO hosts (province, operator, ip_port, path, first_seen, last_seen) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (ip_port, path, province, operator) DO UPDATE SET last_seen = excluded.last_seen", rows)
+
+    def seed(self, province, operator, path):
+        """结果库中还没有该省份运营商的记录时（如CI中首次运行），导入已有的导出文件，发现时间取文件修改时间
+
+        文件每行为 url（http://ip:port/stat）或 ip:port，后者按 /stat 记录；返回导入的行数。
+        """
+        exists = self.conn.execute("SELECT 1 FROM hosts WHERE province = ? AND operator = ? LIMIT 1",
+                                   (province, operator)).fetchone()
+        if exists or not os.path.exists(path):
+            return 0
+        ts = int(os.path.getmtime(path))
+        rows = []
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                parsed = urlparse(line if '://' in line else f"http://{line}")
+                rows.append((province, operator, parsed.netloc, parsed.path or '/stat', ts, ts))
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO hosts (province, operator, ip_port, path, first_seen, last_seen) "
+                "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def update_speed(self, speeds):
+        """批量写入主机测速结果 {ip_port: MB/s}"""
+        with self.conn:
+            self.conn.executemany("UPDATE hosts SET last_speed = ? WHERE ip_port = ?",
+                                  [(speed, ip_port) for ip_port, speed in speeds.items()])
+
+    def alive(self, province, operator, hours=ALIVE_HOURS):
+        """最近 hours 小时内发现的有效主机 [(ip_port, path, last_speed), ...]，测速快的在前"""
+        since = int(time.time() - hours * 3600)
+        return self.conn.execute(
+            "SELECT ip_port, path, last_speed FROM hosts WHERE province = ? AND operator = ? AND last_seen >= ? "
+            "ORDER BY last_speed IS NULL, last_speed DESC, ip_port", (province, operator, since)).fetchall()
+
+    def groups(self):
+        return self.conn.execute("SELECT DISTINCT province, operator FROM hosts ORDER BY province, operator").fetchall()
+
+    def export(self, province, operator, path, hours=ALIVE_HOURS, fmt="url"):
+        """导出有效主机到文本文件，fmt 为 url（http://ip:port/stat）或 ip_port"""
+        lines = [f"http://{ip_port}{p}" if fmt == "url" else ip_port
+                 for ip_port, p, _ in self.alive(province, operator, hours)]
+        if fmt != "url":
+            lines = list(dict.fromkeys(lines))
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n' if lines else '')
+        return len(lines)
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="从结果库导出有效主机")
+    parser.add_argument('--hours', type=float, default=ALIVE_HOURS, help="导出最近多少小时内发现的主机")
+    parser.add_argument('--format', choices=['url', 'ip_port'], default='url')
+    args = parser.parse_args()
+    store = ResultStore()
+    for province, operator in store.groups():
+        path = os.path.join('ip', f"{province}{operator}_ip.txt")
+        count = store.export(province, operator, path, args.hours, args.format)
+        print(f"{province}{operator}: 导出 {count} 条 -> {path}")
+    store.close()
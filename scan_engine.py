@@ -0,0 +1,212 @@
+import os
+import time
+import asyncio
+import aiohttp
+import metrics
+import probe_control
+import port_scan
+
+# 同时进行的探测数量，可通过环境变量 SCAN_CONCURRENCY 调整
+DEFAULT_CONCURRENCY = int(os.environ.get("SCAN_CONCURRENCY", 1000))
+DEFAULT_TIMEOUT = 2
+# 第一阶段TCP连接超时，设为0则跳过预筛直接发HTTP请求
+DEFAULT_CONNECT_TIMEOUT = float(os.environ.get("SCAN_CONNECT_TIMEOUT", 1))
+UDPXY_KEYWORDS = ("Multi stream daemon", "udpxy status")
+# 按探测结果自适应调整并发及超时，设为0则固定使用配置值
+ADAPTIVE = os.environ.get("SCAN_ADAPTIVE", "1") != "0"
+# 整个运行的时间预算(秒)，0为不限制；到期或调用 stop_run() 后所有扫描不再取新地址，已有结果照常返回
+RUN_BUDGET = float(os.environ.get("RUN_BUDGET", 0))
+
+run_deadline = None
+
+
+def start_run(budget=RUN_BUDGET):
+    global run_deadline
+    run_deadline = time.time() + budget if budget else None
+
+
+def stop_run():
+    """让进行中及之后的扫描尽快结束，可在信号处理函数中调用"""
+    global run_deadline
+    run_deadline = time.time()
+
+
+def expired(deadline=None):
+    """超过 deadline 时间戳或整个运行的时间预算"""
+    now = time.time()
+    return bool(deadline and now > deadline or run_deadline and now > run_deadline)
+
+
+async def connect(ip_port, timeout, control=None):
+    """由 port_scan 做非阻塞TCP连接测试并记录指标，返回 (结果, 耗时)，结果同 port_scan.connect
+
+    本机资源耗尽时稍后重试同一地址，每次都计为 control 的连接错误，用于降低并发。
+    """
+    def local_error():
+        metrics.inc("scan.connect_local")
+        if control:
+            control.connect_error()
+
+    ip, port = ip_port.rsplit(':', 1)
+    state, rtt = await port_scan.connect_retry(ip, port, timeout, local_error)
+    if state == "open":
+        metrics.observe("scan.connect", rtt)
+    elif state != "local":
+        metrics.inc(f"scan.connect_{state}")
+    return state, rtt
+
+
+async def probe(session, ip_port, url_ends, keywords, timeout, control=None):
+    """依次请求各状态页，返回第一个内容匹配的url；control 为 AimdController 时记录HTTP耗时及超时
+
+    自适应收紧的超时内没有响应时，按配置的超时重试一次，慢主机不会因超时收紧而漏掉。
+    """
+    for url_end in url_ends:
+        url = f"http://{ip_port}{url_end}"
+        limits = [timeout]
+        if control and control.http_ceiling > timeout:
+            limits.append(control.http_ceiling)
+        for limit in limits:
+            begin = time.time()
+            try:
+                async with session.get(url, timeout=aiohttp.ClientTimeout(total=limit)) as resp:
+                    if resp.status != 200:
+                        break
+                    text = await resp.text(errors='ignore')
+                    metrics.observe("scan.http", time.time() - begin)
+                    if control:
+                        control.http_result(time.time() - begin)
+                    if any(k in text for k in keywords):
+                        return url
+                    break
+            except asyncio.TimeoutError:
+                metrics.inc("scan.http_timeout")
+                if control:
+                    control.http_result(None)
+            except Exception:
+                metrics.inc("scan.http_error")
+                break
+    return None
+
+
+def ip_to_int(ip):
+    a, b, c, d = map(int, ip.split('.'))
+    return (a << 24) | (b << 16) | (c << 8) | d
+
+
+def int_to_ip(n):
+    return f"{n >> 24 & 255}.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}"
+
+
+async def _scan(ip_ports, url_ends, keywords, concurrency, timeout, connect_timeout, on_hit, progress_interval,
+                total, on_result, deadline, adaptive):
+    hits = []
+    checked = [0]
+    opened = [0]
+    # 所有worker共享同一个迭代器，按需取地址，同时在途的探测数不超过并发上限
+    targets = iter(ip_ports)
+    control = probe_control.AimdController(concurrency, connect_timeout, timeout) if adaptive else None
+    workers = []
+    gate = asyncio.Condition()
+    stopped = [False]
+
+    async def worker(index):
+        for ip_port in targets:
+            if expired(deadline):
+                break
+            url = None
+            begin = time.time()
+            # 两阶段：先TCP连接预筛，端口开放才发送HTTP状态页请求
+            if connect_timeout:
+                state, rtt = await connect(ip_port, control.connect_timeout if control else connect_timeout, control)
+                if control and state in ("open", "refused"):
+                    control.connected(rtt)
+            if not connect_timeout or state == "open":
+                opened[0] += 1
+                url = await probe(session, ip_port, url_ends, keywords,
+                                  control.timeout if control else timeout, control)
+            checked[0] += 1
+            metrics.inc("scan.probes")
+            if on_result:
+                on_result(ip_port, url, time.time() - begin)
+            if url:
+                found(ip_port, url)
+            if control:
+                if control.finished():
+                    spawn()
+                    metrics.gauge("scan.concurrency", control.limit)
+                    metrics.gauge("scan.connect_timeout_s", round(control.connect_timeout, 3))
+                    metrics.gauge("scan.http_timeout_s", round(control.timeout, 3))
+                    async with gate:
+                        gate.notify_all()
+                # 序号超过当前并发上限的worker暂停，上限提高后再继续
+                if index >= control.limit:
+                    async with gate:
+                        await gate.wait_for(lambda: index < control.limit or stopped[0])
+        # 地址取完或到达截止时间，唤醒暂停的worker退出
+        stopped[0] = True
+        if control:
+            async with gate:
+                gate.notify_all()
+
+    def found(ip_port, url):
+        hits.append((ip_port, url))
+        metrics.inc("scan.hits")
+        metrics.inc("scan.hits_per_24", key=ip_port.rsplit('.', 1)[0])
+        if on_hit:
+            on_hit(ip_port, url)
+
+    def spawn():
+        # 按当前并发上限补充worker，上限降低时多出的worker自行暂停
+        while len(workers) < (control.limit if control else concurrency) and not stopped[0]:
+            workers.append(asyncio.ensure_future(worker(len(workers))))
+
+    async def show_progress():
+        while True:
+            await asyncio.sleep(progress_interval)
+            if total:
+                metrics.gauge("scan.pending", total - checked[0])
+            print(f"进度: {checked[0]}/{total or '?'} 端口开放: {opened[0]} 有效: {len(hits)}"
+                  + (f" 并发: {control.limit} 超时: {control.connect_timeout:.2f}s/{control.timeout:.2f}s"
+                     if control else ""))
+
+    # 保持连接，同一主机的多个状态页复用一个连接
+    connector = aiohttp.TCPConnector(limit=control.max if control else concurrency, keepalive_timeout=timeout,
+                                     ssl=False)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        reporter = asyncio.ensure_future(show_progress()) if progress_interval else None
+        try:
+            spawn()
+            # 运行中可能新增worker，逐个等待直到全部结束
+            i = 0
+            while i < len(workers):
+                await workers[i]
+                i += 1
+        finally:
+            if reporter:
+                reporter.cancel()
+    if connect_timeout:
+        print(f"TCP预筛: {checked[0]} 个地址中 {opened[0]} 个端口开放，进入HTTP检测")
+    return hits, checked[0]
+
+
+def scan(ip_ports, url_ends=("/stat",), keywords=UDPXY_KEYWORDS, concurrency=DEFAULT_CONCURRENCY,
+         timeout=DEFAULT_TIMEOUT, connect_timeout=DEFAULT_CONNECT_TIMEOUT, on_hit=None, progress_interval=10,
+         total=None, on_result=None, deadline=None, adaptive=ADAPTIVE):
+    """在单个事件循环中并发探测 ip:port 序列，返回 [(ip_port, url), ...]
+
+    ip_ports 可以是生成器，按需取用，内存占用与扫描范围大小无关；命中结果通过 on_hit 实时回调，
+    每个地址的探测结果（url或None、耗时）通过 on_result 回调。超过 deadline 时间戳或运行预算后不再取新地址。
+    connect_timeout 为TCP预筛阶段超时，timeout 为HTTP阶段超时，两者分别计算。
+    adaptive 时 concurrency 为起始并发，按探测结果自适应调整，两个超时作为上限按成功耗时收紧。
+    """
+    start = time.time()
+    hits, checked = asyncio.run(_scan(ip_ports, url_ends, keywords, concurrency, timeout, connect_timeout,
+                                      on_hit, progress_interval, total, on_result, deadline, adaptive))
+    print(f"探测 {checked} 个地址，用时 {time.time() - start:.1f}s，有效 {len(hits)} 个")
+    return hits
+
+
+def sweep(ips, port, **kwargs):
+    """扫描整数地址区间 ips（如range）上的同一端口，地址字符串在取用时才生成"""
+    return scan((f"{int_to_ip(n)}:{port}" for n in ips), total=len(ips), **kwargs)
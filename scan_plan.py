@@ -0,0 +1,57 @@
+from collections import defaultdict
+import scan_engine
+import host_cache
+
+
+def merge(entries):
+    """把各配置的扫描范围合并为最少的扫描任务
+
+    entries 为 [(owner, ips, port), ...]，ips 为整数地址区间；同一端口下重叠或相邻的区间合并为一个任务。
+    返回 [(ips, port, [(owner, ips), ...]), ...]
+    """
+    by_port = defaultdict(list)
+    for owner, ips, port in entries:
+        by_port[str(port)].append((ips, owner))
+
+    plan = []
+    for port, items in by_port.items():
+        items.sort(key=lambda x: (x[0].start, -x[0].stop))
+        start, stop, owners = None, None, []
+        for ips, owner in items:
+            if owners and ips.start <= stop:
+                stop = max(stop, ips.stop)
+            else:
+                if owners:
+                    plan.append((range(start, stop), port, owners))
+                start, stop, owners = ips.start, ips.stop, []
+            owners.append((owner, ips))
+        if owners:
+            plan.append((range(start, stop), port, owners))
+    return plan
+
+
+def run(entries, scan_fn, on_found=None):
+    """按合并后的任务扫描，每个 ip:port 只探测一次，结果按地址范围分发回各配置
+
+    scan_fn(ips, port, enough, on_hit=...) 返回 [(ip_port, url), ...]；任务只属于一个配置时才按 SCAN_ENOUGH 提前结束。
+    提供 on_found(owner, ip_port, url) 时，每个命中在扫描过程中立即分发，不必等待整个任务结束。
+    返回 {owner: [(ip_port, url), ...]}
+    """
+    plan = merge(entries)
+    print(f"共 {len(entries)} 条扫描配置，合并为 {len(plan)} 个扫描任务")
+    results = defaultdict(dict)
+    for ips, port, owners in plan:
+        single = len({owner for owner, _ in owners}) == 1
+
+        def dispatch(ip_port, url, owners=owners):
+            n = scan_engine.ip_to_int(ip_port.rsplit(':', 1)[0])
+            for owner, owner_ips in owners:
+                if n in owner_ips and ip_port not in results[owner]:
+                    results[owner][ip_port] = url
+                    if on_found:
+                        on_found(owner, ip_port, url)
+
+        kwargs = {"on_hit": dispatch} if on_found else {}
+        for ip_port, url in scan_fn(ips, port, host_cache.SCAN_ENOUGH if single else 0, **kwargs):
+            dispatch(ip_port, url)
+    return {owner: list(hits.items()) for owner, hits in results.items()}
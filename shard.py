@@ -0,0 +1,66 @@
+import os
+import glob
+import json
+import zlib
+
+SHARD_DIR = 'shards'
+
+# 当前进程负责的分片 (序号, 总数)，按/24网段或按省份划分；None 表示不分片
+current = None
+mode = "subnet"
+
+
+def parse(text):
+    """解析 i/N 形式的分片参数"""
+    i, n = map(int, text.split('/'))
+    if not 0 <= i < n:
+        raise ValueError(f"分片序号需在 0~{n - 1} 之间: {text}")
+    return i, n
+
+
+def set_shard(index, total, by="subnet"):
+    global current, mode
+    current = (index, total)
+    mode = by
+
+
+def owns_block(block):
+    """按/24网段分片时，判断网段是否属于当前分片"""
+    if current is None or mode != "subnet":
+        return True
+    return block % current[1] == current[0]
+
+
+def owns_config(config_path):
+    """按省份分片时，判断配置文件是否属于当前分片"""
+    if current is None or mode != "province":
+        return True
+    return zlib.crc32(os.path.basename(config_path).encode('utf-8')) % current[1] == current[0]
+
+
+def suffix():
+    return f".{current[0]}of{current[1]}" if current else ""
+
+
+def save_partial(name, data):
+    """保存当前分片的结果，写临时文件后改名，避免留下不完整文件"""
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    path = os.path.join(SHARD_DIR, f"{name}{suffix()}.json")
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(path + '.tmp', path)
+    print(f"分片结果已保存: {path}")
+
+
+def clear_partials(name):
+    for path in glob.glob(os.path.join(SHARD_DIR, f"{name}.*of*.json")):
+        os.remove(path)
+
+
+def load_partials(name):
+    partials = []
+    for path in sorted(glob.glob(os.path.join(SHARD_DIR, f"{name}.*of*.json"))):
+        with open(path, 'r', encoding='utf-8') as f:
+            partials.append(json.load(f))
+    print(f"读取分片结果 {len(partials)} 个")
+    return partials
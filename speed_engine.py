@@ -0,0 +1,206 @@
+import os
+from collections import OrderedDict, deque
+from queue import Queue
+from threading import Thread, Condition
+from urllib.parse import urlparse
+import http_pool
+import ts_probe
+import metrics
+
+SPEED_MODE = os.environ.get("SPEED_MODE", "host")          # host: 按主机抽样测速；channel: 逐个频道测速
+SAMPLE_SIZE = int(os.environ.get("SPEED_SAMPLE", 3))        # 每个主机完整测速的频道数
+DOWNLOAD_TIME = 5       # 完整测速最长时长(秒)，速度稳定后提前结束
+FIRST_BYTES_TIMEOUT = 2  # 其余频道首包检测超时(秒)
+MIN_SPEED = ts_probe.MIN_SPEED
+PER_HOST = int(os.environ.get("SPEED_PER_HOST", 1))  # 每个主机同时测速的频道数
+
+
+def measure(url, duration=DOWNLOAD_TIME):
+    """下载 duration 秒并解析TS流，返回质量统计，速度为有效TS数据速度(MB/s)"""
+    stats = ts_probe.probe(url, duration)
+    metrics.inc("speed.tests")
+    if stats["speed"] > MIN_SPEED:
+        metrics.inc("speed.ok")
+    if stats["packets"]:
+        metrics.observe("speed.ttfp", stats["ttfp"])
+    metrics.transfer(urlparse(url).netloc, stats["packets"] * ts_probe.TS_PACKET, stats["duration"])
+    return stats
+
+
+def first_bytes(url, timeout=FIRST_BYTES_TIMEOUT):
+    """只检测频道能否在 timeout 秒内返回数据"""
+    try:
+        with http_pool.get(url, stream=True, timeout=timeout) as r:
+            if r.status_code != 200:
+                return False
+            return bool(next(r.iter_content(1024), b''))
+    except Exception:
+        return False
+
+
+def report(stats, name):
+    speed = stats["speed"]
+    print(f"[测速] {'✓' if speed > MIN_SPEED else '✗'} {name[:20]:<20} {speed:.2f}MB/s "
+          f"首包{stats['ttfp']:.2f}s CC错误{stats['cc_errors']} {'PAT/PMT' if stats['psi'] else '无PAT/PMT'}")
+
+
+def group_by_host(channels):
+    groups = {}
+    for name, url in channels:
+        groups.setdefault(urlparse(url).netloc, []).append((name, url))
+    return groups
+
+
+class HostScheduler:
+    """按主机分组的测速任务队列
+
+    每个主机同时进行的测速不超过 per_host 个，各主机轮流取任务，避免同一转发主机的多路测速互相抢带宽。
+    """
+
+    def __init__(self, per_host=PER_HOST):
+        self.per_host = per_host
+        self.queues = OrderedDict()
+        self.pending = 0
+        self.active = {}
+        self.closed = False
+        self.cond = Condition()
+
+    def put(self, channel):
+        host = urlparse(channel[1]).netloc
+        with self.cond:
+            self.queues.setdefault(host, deque()).append(channel)
+            self.pending += 1
+            metrics.gauge("speed.queue", self.pending)
+            self.cond.notify()
+
+    def get(self):
+        """取下一个可测速的频道；队列已关闭且没有待测频道时返回None，否则等待"""
+        with self.cond:
+            while True:
+                for host, queue in self.queues.items():
+                    if self.active.get(host, 0) < self.per_host:
+                        channel = queue.popleft()
+                        if queue:
+                            self.queues.move_to_end(host)
+                        else:
+                            del self.queues[host]
+                        self.active[host] = self.active.get(host, 0) + 1
+                        self.pending -= 1
+                        metrics.gauge("speed.queue", self.pending)
+                        return channel
+                if self.closed and not self.queues:
+                    return None
+                self.cond.wait()
+
+    def close(self):
+        """不再加入新频道，取完后 get 返回None"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def done(self, channel):
+        host = urlparse(channel[1]).netloc
+        with self.cond:
+            self.active[host] -= 1
+            self.cond.notify_all()
+
+
+def test_host(host, channels, sample=SAMPLE_SIZE):
+    """抽取均匀分布的几个频道完整测速得到主机速度，其余频道只做首包检测并沿用主机速度"""
+    step = max(len(channels) // sample, 1)
+    samples = channels[::step][:sample]
+    results = []
+    for name, url in samples:
+        stats = measure(url)
+        report(stats, name)
+        if stats["speed"] > MIN_SPEED:
+            results.append((name, url, stats))
+    if not results:
+        print(f"[测速] ✗ 主机 {host} 抽样频道均无效，跳过其余 {len(channels) - len(samples)} 个频道")
+        return results
+
+    # 按评分取中位的抽样结果作为主机评级
+    rating = sorted((r[2] for r in results), key=ts_probe.score)[len(results) // 2]
+    passed = 0
+    for name, url in channels:
+        if (name, url) in samples:
+            continue
+        if first_bytes(url):
+            results.append((name, url, rating))
+            passed += 1
+    print(f"[测速] 主机 {host} 速度 {rating['speed']:.2f}MB/s，首包检测通过 {passed}/{len(channels) - len(samples)}")
+    return results
+
+
+class SpeedPipeline:
+    """测速流水线：测速线程先启动，扫描到主机后随时加入频道，close 后等待测速完成并返回结果
+
+    测速线程为守护线程，扫描出错或被中断时调用 abort 丢弃待测频道，进程不会等待测速线程而无法退出。
+    """
+
+    def __init__(self, num_threads=20, mode=SPEED_MODE):
+        self.mode = mode
+        self.results = []
+        self.hosts = Queue()
+        self.scheduler = HostScheduler()
+        self.threads = [Thread(target=self.worker, daemon=True) for _ in range(num_threads)]
+        [t.start() for t in self.threads]
+
+    def add(self, channels):
+        """加入同一转发主机的一组频道 [(name, url), ...]"""
+        if not channels:
+            return
+        if self.mode == "channel":
+            for channel in channels:
+                self.scheduler.put(channel)
+        else:
+            self.hosts.put((urlparse(channels[0][1]).netloc, channels))
+            metrics.gauge("speed.host_queue", self.hosts.qsize())
+
+    def worker(self):
+        if self.mode == "channel":
+            # 逐个频道完整测速，同一主机同时只测 PER_HOST 个频道
+            while True:
+                channel = self.scheduler.get()
+                if channel is None:
+                    break
+                name, url = channel
+                stats = measure(url)
+                self.scheduler.done(channel)
+                if stats["speed"] > MIN_SPEED:
+                    self.results.append((name, url, stats))
+                report(stats, name)
+        else:
+            # 按转发主机测速，每个主机由一个线程顺序测试，同一主机不会同时有多路测速
+            while True:
+                item = self.hosts.get()
+                metrics.gauge("speed.host_queue", self.hosts.qsize())
+                if item is None:
+                    break
+                self.results.extend(test_host(*item))
+
+    def close(self):
+        self.scheduler.close()
+        for _ in self.threads:
+            self.hosts.put(None)
+        [t.join() for t in self.threads]
+        return self.results
+
+    def abort(self):
+        """丢弃未开始的测速并让测速线程退出，不等待进行中的测速"""
+        with self.scheduler.cond:
+            self.scheduler.queues.clear()
+            self.scheduler.pending = 0
+        self.scheduler.close()
+        while not self.hosts.empty():
+            self.hosts.get_nowait()
+        for _ in self.threads:
+            self.hosts.put(None)
+
+
+def run(channels, num_threads=20):
+    """对已知的全部频道测速"""
+    pipeline = SpeedPipeline(num_threads)
+    for host_channels in group_by_host(channels).values():
+        pipeline.add(host_channels)
+    return pipeline.close()
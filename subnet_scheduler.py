@@ -0,0 +1,82 @@
+from collections import deque
+import shard
+
+
+def block_key(block):
+    """/24网段编号转为 a.b.c 形式"""
+    return f"{block >> 16 & 255}.{block >> 8 & 255}.{block & 255}"
+
+
+class SubnetScheduler:
+    """按/24网段安排扫描顺序
+
+    历史命中多的网段先扫，本次新命中网段的相邻网段插队提前；有效主机数达到 enough 后停止产出地址。
+    分片运行时只产出属于当前分片的网段。
+    stats 为 {a.b.c: 命中次数}，命中时原地累加，由调用方负责保存。
+    done 为已扫描完成、本次跳过的网段；每个网段的地址全部取得结果（见 result）后回调 on_block(网段)。
+    """
+
+    def __init__(self, ips, stats, skip=(), enough=0, done=(), on_block=None):
+        self.ips = ips
+        self.stats = stats
+        self.skip = skip
+        self.enough = enough
+        self.found = 0
+        self.stopped = False
+        self.first, self.last = ips[0] >> 8, ips[-1] >> 8
+        blocks = [b for b in range(self.first, self.last + 1) if shard.owns_block(b) and b not in done]
+        self.pending = deque(sorted(blocks, key=lambda b: (-stats.get(block_key(b), 0), b)))
+        self.total = sum(min((b + 1) << 8, ips.stop) - max(b << 8, ips.start) for b in blocks) - len(skip)
+        self.hot = deque()
+        self.done = set(done)
+        self.on_block = on_block
+        self.issued = {}
+        self.returned = {}
+        self.closed = set()
+
+    def __iter__(self):
+        while not self.stopped:
+            if self.hot:
+                block = self.hot.popleft()
+            elif self.pending:
+                block = self.pending.popleft()
+            else:
+                return
+            if block in self.done:
+                continue
+            self.done.add(block)
+            self.issued[block] = 0
+            for n in range(max(block << 8, self.ips.start), min((block + 1) << 8, self.ips.stop)):
+                if self.stopped:
+                    return
+                if n not in self.skip:
+                    self.issued[block] += 1
+                    yield n
+            self.closed.add(block)
+            self.check_block(block)
+
+    def result(self, n):
+        """地址 n 已取得探测结果"""
+        block = n >> 8
+        self.returned[block] = self.returned.get(block, 0) + 1
+        self.check_block(block)
+
+    def check_block(self, block):
+        if block in self.closed and self.returned.get(block, 0) == self.issued[block]:
+            self.closed.discard(block)
+            if self.on_block:
+                self.on_block(block)
+
+    def hit(self, n):
+        block = n >> 8
+        key = block_key(block)
+        self.stats[key] = self.stats.get(key, 0) + 1
+        for neighbour in (block - 1, block + 1):
+            if self.first <= neighbour <= self.last and neighbour not in self.done and shard.owns_block(neighbour):
+                self.hot.append(neighbour)
+        self.count()
+
+    def count(self, n=1):
+        self.found += n
+        if self.enough and self.found >= self.enough:
+            self.stopped = True
@@ -0,0 +1,219 @@
+import time
+import http_pool
+
+TS_PACKET = 188
+SYNC_BYTE = 0x47
+NULL_PID = 0x1FFF
+READ_SIZE = TS_PACKET * 348  # 每次读取约64KB
+
+MIN_SPEED = 0.1       # 低于该速度(MB/s)视为无效
+MIN_TIME = 1.0        # 至少测速时长(秒)，之后速度估计稳定即提前结束
+SLOT_TIME = 0.25      # 速度采样时间片(秒)
+WINDOW_SLOTS = 8      # 滑动窗口内的时间片数
+STABLE_CV = 0.15      # 窗口内速度变异系数低于该值视为结果可信
+STALL_TIMEOUT = 2     # 超过该时间(秒)收不到数据视为断流
+
+
+class TsStats:
+    """逐包解析MPEG-TS，统计首包时间、有效包数、连续计数错误及PAT/PMT
+
+    0x47 在任意数据中都常见，只有其后间隔188字节处也是同步字节才接受为一个包；未同步时要求连续3个包位置，
+    同步后任一包位置检查失败即失去同步并逐字节重新寻找，跳过的字节计入 skipped。
+    """
+
+    def __init__(self):
+        self.start = time.time()
+        self.ttfp = None
+        self.bytes = 0
+        self.packets = 0
+        self.skipped = 0
+        self.locked = False
+        self.cc_errors = 0
+        self.has_pat = False
+        self.has_pmt = False
+        self.pmt_pids = set()
+        self.cc = {}
+        self.stop = None
+
+    def parse(self, view):
+        """解析 view 中的TS包，返回已处理的字节数，剩余不足以确认同步的数据留待下次"""
+        i = 0
+        size = len(view)
+        while True:
+            if i + (2 if self.locked else 3) * TS_PACKET > size:
+                break
+            if view[i] != SYNC_BYTE or view[i + TS_PACKET] != SYNC_BYTE or \
+                    (not self.locked and view[i + 2 * TS_PACKET] != SYNC_BYTE):
+                if self.locked:
+                    self.locked = False
+                else:
+                    self.skipped += 1
+                    i += 1
+                continue
+            self.locked = True
+            pid = (view[i + 1] & 0x1F) << 8 | view[i + 2]
+            afc = view[i + 3] >> 4 & 3
+            cc = view[i + 3] & 0x0F
+            if pid != NULL_PID and afc & 1:
+                last = self.cc.get(pid)
+                if last is not None and cc != last and cc != (last + 1) & 0x0F:
+                    self.cc_errors += 1
+                self.cc[pid] = cc
+            if pid == 0 and not self.has_pat:
+                self.parse_pat(view[i:i + TS_PACKET])
+            elif pid in self.pmt_pids:
+                self.has_pmt = True
+            if self.ttfp is None:
+                self.ttfp = time.time() - self.start
+            self.packets += 1
+            i += TS_PACKET
+        return i
+
+    def parse_pat(self, pkt):
+        if not pkt[1] & 0x40:  # 只解析带有表头的包
+            return
+        p = 4
+        if pkt[3] & 0x20:
+            p += 1 + pkt[4]
+        p += 1 + pkt[p]  # pointer_field
+        if p + 8 > TS_PACKET or pkt[p] != 0:
+            return
+        section_end = min(p + 3 + ((pkt[p + 1] & 0x0F) << 8 | pkt[p + 2]) - 4, TS_PACKET - 4)
+        for j in range(p + 8, section_end, 4):
+            if pkt[j] << 8 | pkt[j + 1]:
+                self.pmt_pids.add((pkt[j + 2] & 0x1F) << 8 | pkt[j + 3])
+        self.has_pat = bool(self.pmt_pids)
+
+    def result(self):
+        elapsed = time.time() - self.start
+        if self.ttfp is not None and elapsed - self.ttfp > SLOT_TIME:
+            elapsed -= self.ttfp  # 速度从首包开始计算，短时测速不受连接耗时影响
+        elapsed = max(elapsed, 1e-6)
+        valid = self.packets * TS_PACKET
+        junk = self.skipped / self.bytes if self.bytes else 0
+        return {
+            "speed": valid / elapsed / 1024 / 1024,   # 有效TS数据速度 MB/s
+            "bitrate": valid * 8 / elapsed / 1e6,      # Mbps
+            "ttfp": self.ttfp if self.ttfp is not None else elapsed,
+            "packets": self.packets,
+            "cc_errors": self.cc_errors,
+            "psi": self.has_pat and self.has_pmt,
+            "junk": junk,                              # 无法同步而跳过的字节比例
+            "duration": time.time() - self.start,
+        }
+
+
+class RateEstimator:
+    """按时间片统计收到的字节数，用滑动窗口内速度的变异系数判断测速结果是否已经可信"""
+
+    def __init__(self):
+        self.begin = None
+        self.slots = []
+
+    def add(self, n, now):
+        if self.begin is None:
+            self.begin = now  # 从首次收到数据开始计时，排除连接耗时
+        index = int((now - self.begin) / SLOT_TIME)
+        while len(self.slots) <= index:
+            self.slots.append(0)
+        self.slots[index] += n
+
+    def verdict(self, now):
+        """返回提前结束的原因：stable 速度稳定，slow 明显低于阈值；需继续测速返回None"""
+        if self.begin is None or now - self.begin < MIN_TIME:
+            return None
+        window = self.slots[:-1][-WINDOW_SLOTS:]  # 只看已结束的时间片
+        if len(window) < 4:
+            return None
+        rates = [b / SLOT_TIME / 1024 / 1024 for b in window]
+        mean = sum(rates) / len(rates)
+        if mean < MIN_SPEED / 2:
+            return "slow"
+        std = (sum((r - mean) ** 2 for r in rates) / len(rates)) ** 0.5
+        if std / mean < STABLE_CV:
+            return "stable" if mean > MIN_SPEED * 2 else "slow"
+        return None
+
+
+def stream_reader(raw):
+    """返回有数据即返回的 readinto 函数，避免为填满缓冲区而等待
+
+    非分块、未压缩的响应（udpxy即是如此）直接从底层socket缓冲区 readinto1，不产生中间拷贝。
+    """
+    fp = getattr(getattr(raw, '_fp', None), 'fp', None)
+    if hasattr(fp, 'readinto1') and not raw.chunked and not raw.headers.get('Content-Encoding'):
+        return fp.readinto1
+
+    def readinto(view):
+        data = raw.read1(len(view))
+        view[:len(data)] = data
+        return len(data)
+    return readinto
+
+
+def read_stream(raw, stats, duration):
+    """用固定缓冲区 readinto 读取流并原地解析，只搬移跨块残留的不足一包数据
+
+    速度估计稳定或明显过慢时提前结束，duration 为最长测速时间。
+    """
+    buf = bytearray(READ_SIZE)
+    view = memoryview(buf)
+    fill = 0
+    estimator = RateEstimator()
+    readinto = stream_reader(raw)
+    while time.time() - stats.start < duration:
+        n = readinto(view[fill:])
+        if not n:
+            break
+        now = time.time()
+        estimator.add(n, now)
+        stats.bytes += n
+        fill += n
+        used = stats.parse(view[:fill])
+        fill -= used
+        if fill:
+            buf[:fill] = buf[used:used + fill]
+        stats.stop = estimator.verdict(now)
+        if stats.stop:
+            break
+
+
+def probe(url, duration=5):
+    """下载并解析TS流，最长 duration 秒，返回质量统计"""
+    stats = TsStats()
+    try:
+        with http_pool.get(url, stream=True, timeout=(duration, STALL_TIMEOUT)) as r:
+            if r.status_code == 200:
+                read_stream(r.raw, stats, duration)
+    except Exception:
+        pass
+    return stats.result()
+
+
+def score(stats):
+    """排序评分：以有效速度为主，缺少PAT/PMT、连续计数错误多、无法同步的字节多、首包慢的降低评分"""
+    if not stats["packets"]:
+        return 0
+    value = stats["speed"]
+    if not stats["psi"]:
+        value *= 0.5
+    value /= 1 + 100 * stats["cc_errors"] / stats["packets"]
+    value /= 1 + 10 * stats["junk"]
+    value /= 1 + stats["ttfp"] / 2
+    return value
+
+
+def format_row(stats):
+    """speed.txt 中速度及之后的列：速度,首包时间,TS包数,连续计数错误,是否有PAT/PMT,跳过字节比例"""
+    return (f"{stats['speed']:.2f},{stats['ttfp']:.2f},{stats['packets']},{stats['cc_errors']},{int(stats['psi'])},"
+            f"{stats['junk']:.3f}")
+
+
+def parse_row(fields):
+    """解析 format_row 生成的列，兼容只有速度一列或没有跳过字节比例的旧格式"""
+    parts = fields.split(',')
+    speed = float(parts[0])
+    if len(parts) < 5:
+        return {"speed": speed, "ttfp": 0, "packets": 1, "cc_errors": 0, "psi": True, "junk": 0}
+    return {"speed": speed, "ttfp": float(parts[1]), "packets": int(parts[2]),
+            "cc_errors": int(parts[3]), "psi": parts[4] == '1', "junk": float(parts[5]) if len(parts) > 5 else 0}
@@ -1,9 +1,16 @@
-from threading import Thread
 import os
-import time
 import glob
-import requests
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import signal
+import argparse
+from urllib.parse import urlparse
+import multiprocessing
+import shard
+import checkpoint
+import metrics
+import result_store
+import scan_engine
+import host_cache
+import scan_plan
 def read_config(config_file):
     print(f"读取设置文件：{config_file}")
     ip_configs = []
@@ -24,62 +31,120 @@ def read_config(config_file):
         return ip_configs
     except Exception as e:
         print(f"设置文件错误: {e}")
-# 生成待扫描ip_port
+# 生成待扫描的整数地址区间，扫描时逐个转换，不预先生成列表
 def generate_ip_ports(ip, port, option):
-    a, b, c, d = map(int, ip.split('.'))
+    base = scan_engine.ip_to_int(ip)
     if option == 1:  # C+D段扫描
-        return [f"{a}.{b}.{x}.{y}:{port}" for x in range(256) for y in range(1,256)]
+        base &= 0xFFFF0000
+        return range(base, base + 65536)
     else:  # D段扫描
-        return [f"{a}.{b}.{c}.{x}:{port}" for x in range(1, 256)]
+        base &= 0xFFFFFF00
+        return range(base + 1, base + 256)
 # 发送get请求检测url是否可访问        
-def check_ip_port(ip_port, url_end):    
-    try:
-        url = f"http://{ip_port}{url_end}"
-        resp = requests.get(url, timeout=2)
-        resp.raise_for_status()
-        if "Multi stream daemon" in resp.text or "udpxy status" in resp.text:
-            print(f"{url} 访问成功")
-            return url
-    except:
-        return None
-# 多线程检测url，获取有效urls
-def scan_ip_port(ip, port, option, url_end):
-    def show_progress():
-        while checked[0] < len(ip_ports) and option == 1:
-            print(f"已扫描：{checked[0]}/{len(ip_ports)}, 有效ip_port：{len(valid_urls)}个")
-            time.sleep(20)
-    valid_urls = []
-    ip_ports = generate_ip_ports(ip, port, option)
-    checked = [0]
-    Thread(target=show_progress, daemon=True).start()
-    with ThreadPoolExecutor(max_workers=300 if option==1 else 50) as executor:
-        futures = {executor.submit(check_ip_port, ip_port, url_end): ip_port for ip_port in ip_ports}
-        for future in as_completed(futures):
-            result = future.result()
-            if result:
-                valid_urls.append(result)
-            checked[0] += 1
-    return valid_urls
+# 异步并发检测url，获取有效urls
+def scan_ip_port(ip, port, option, url_end, enough=0):
+    return [url for _, url in scan_range(generate_ip_ports(ip, port, option), port, enough, (url_end,))]
+# 扫描整数地址区间，同一连接上依次尝试各状态页
+def scan_range(ips, port, enough=0, url_ends=("/stat", "/status"), on_hit=None):
+    return host_cache.incremental_sweep(ips, port, url_ends=url_ends, timeout=2,
+                                        on_hit=on_hit or (lambda ip_port, url: print(f"{url} 访问成功")),
+                                        progress_interval=20 if len(ips) > 256 else 0, enough=enough)
+# 合并所有设置文件统一扫描，每个ip_port只探测一次
+def scan_all(config_files):
+    entries = [(config_file, generate_ip_ports(ip, port, option), port)
+               for config_file in config_files for ip, port, option in set(read_config(config_file) or [])]
+    found = scan_plan.run(entries, scan_range)
+    return {config_file: [url for _, url in found.get(config_file, [])] for config_file in config_files}
 
-def multicast_province(config_file):
+def multicast_province(config_file, valid_urls=None):
     filename = os.path.basename(config_file)
     province, operator = filename.split('_')[:2]
     print(f"{'='*25}\n   获取: {province}{operator}ip_port\n{'='*25}")
-    configs = sorted(set(read_config(config_file)))
-    valid_urls = []
-    for ip, port, option in configs:
-        url_ends = ["/stat", "/status"]
-        for url_end in url_ends:
-            print(f"\n开始扫描 ip：{ip}，port：{port}，url_end：{url_end} ")
-            valid_urls.extend(scan_ip_port(ip, port, option, url_end))
+    if valid_urls is None:
+        configs = sorted(set(read_config(config_file)))
+        valid_urls = []
+        for ip, port, option in configs:
+            quota = host_cache.SCAN_ENOUGH - len(valid_urls)
+            if host_cache.SCAN_ENOUGH and quota <= 0:
+                break
+            print(f"\n开始扫描 ip：{ip}，port：{port}")
+            valid_urls.extend(url for _, url in scan_range(generate_ip_ports(ip, port, option), port, max(quota, 0)))
     valid_urls = sorted(set(valid_urls))
     print(f"{province}{operator} 扫描完成，获取有效ip_port共：{len(valid_urls)}个")
     for url in valid_urls:
         print(url)
-    with open(f"ip/{province}{operator}_ip.txt", 'a', encoding='utf-8') as f:
-        f.write('\n'.join(valid_urls) + '\n')   #有效url写入文件
+    # 有效url写入结果库，再导出最近发现的有效url到文件
+    # 结果库为空时先导入仓库中已有的导出文件，最近发现时间从上次导出延续
+    store = result_store.ResultStore()
+    store.seed(province, operator, f"ip/{province}{operator}_ip.txt")
+    store.upsert(province, operator, [(urlparse(url).netloc, url) for url in valid_urls])
+    count = store.export(province, operator, f"ip/{province}{operator}_ip.txt")
+    store.close()
+    print(f"导出最近{result_store.ALIVE_HOURS}小时内的有效url共：{count}个")
+
+def start_run():
+    """开始计算运行时间预算；收到SIGTERM（如CI的timeout）时停止扫描，让断点及结果照常写入后再退出"""
+    def stop(signum, frame):
+        print("\n收到结束信号，停止扫描并保存已有结果")
+        scan_engine.stop_run()
+    signal.signal(signal.SIGTERM, stop)
+    scan_engine.start_run()
+
+def run_shard(index, total, by="subnet", resume=False):
+    """只扫描属于第 index 个分片的网段或省份，结果保存到 shards/ 目录等待合并"""
+    shard.set_shard(index, total, by)
+    start_run()
+    metrics.start()
+    cp = checkpoint.enable(resume)
+    config_files = [f for f in glob.glob(os.path.join('ip', '*_config.txt')) if shard.owns_config(f)]
+    print(f"\n运行分片 {index}/{total}，设置文件 {len(config_files)} 个")
+    shard.save_partial('zubo', scan_all(config_files))
+    cp.clear()
+    metrics.summary()
+
+def merge_shards():
+    found = {}
+    for partial in shard.load_partials('zubo'):
+        for config_file, urls in partial.items():
+            found.setdefault(config_file, []).extend(urls)
+    for config_file, urls in found.items():
+        multicast_province(config_file, urls)
+
+def run_processes(num, by="subnet", resume=False):
+    shard.clear_partials('zubo')
+    # 每个分片使用新的进程，指标、分片及断点等模块级状态不会带到下一个分片
+    with multiprocessing.Pool(num, maxtasksperchild=1) as pool:
+        pool.starmap(run_shard, [(i, num, by, resume) for i in range(num)])
+    merge_shards()
+
+def main(resume=False):
+    print("\n开始获取组播源")
+    # 扫描进度定期写入断点文件，中断后可用 --resume 继续
+    cp = checkpoint.enable(resume)
+    start_run()
+    metrics.start()
+    config_files = glob.glob(os.path.join('ip', '*_config.txt'))
+    found = scan_all(config_files)
+    for config_file in config_files:
+        multicast_province(config_file, found[config_file])
+    cp.clear()
+    metrics.summary()
+    print(f"组播源获取完成")
 
-print("\n开始获取组播源")
-for config_file in glob.glob(os.path.join('ip', '*_config.txt')):
-    multicast_province(config_file)
-print(f"组播源获取完成")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="扫描组播源ip_port")
+    parser.add_argument('--shard', help="只运行第 i 个分片（格式 i/N），结果保存到 shards/ 目录")
+    parser.add_argument('--shard-by', choices=['subnet', 'province'], default='subnet',
+                        help="分片方式：按/24网段或按省份")
+    parser.add_argument('--processes', type=int, default=0, help="本机按分片启动多个进程运行后合并")
+    parser.add_argument('--merge', action='store_true', help="合并 shards/ 目录中的分片结果")
+    parser.add_argument('--resume', action='store_true', help="从上次中断的断点继续扫描")
+    args = parser.parse_args()
+    if args.shard:
+        run_shard(*shard.parse(args.shard), args.shard_by, args.resume)
+    elif args.merge:
+        merge_shards()
+    elif args.processes:
+        run_processes(args.processes, args.shard_by, args.resume)
+    else:
+        main(args.resume)